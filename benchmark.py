@@ -0,0 +1,322 @@
+'''
+benchmark.py
+
+Benchmarks for the search algorithms in minimax.py.
+
+Each engine searches a fixed catalogue of positions from the bundled games, and for each search the
+number of nodes, the nodes per second, the wall time and the peak memory are reported.  The results
+can be saved to a JSON file and compared against a saved baseline, to spot regressions.  Run it with:
+
+    python benchmark.py [--output FILE] [--baseline FILE] [--repeat N] [--tolerance FRACTION] [--only NAME]
+
+The results are compared with benchmark-baseline.json, kept next to this file, unless another
+baseline is given.  The exit status is 1 if any search is slower, visits more nodes or uses more
+memory than the baseline, by more than the tolerance.  Save a new baseline after a change that is
+meant to alter the numbers with:
+
+    python benchmark.py --repeat 3 --output benchmark-baseline.json
+
+The engines include the parallel searches, the root split SearchPool ("parallel") and the young
+brothers wait YBWPool ("ybw"), and Monte Carlo tree search ("mcts").  Their nodes and times vary from
+run to run with the order the workers finish in, and only the main process's memory is counted.
+Use --only to run them, or any other engine or position, on their own.
+
+    python benchmark.py --lazysmp [WORKERS]
+
+instead compares the time Lazy SMP takes to search a Connect 4 position to each depth with the
+time a single process takes, using the given number of workers (one per CPU by default).
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from minimax import computerMoveMinimax, computerMoveNegamax, computerMoveIterative, computerMoveLazySMP
+from minimax import computerMoveParallel, computerMoveYBW, SearchPool, YBWPool
+from minimax import SearchLimits, ALG_MINIMAX, ALG_ALPHABETA
+from mcts import MCTS
+from transposition import TranspositionTable, SharedTranspositionTable
+from gamestate import Stack2D
+from silly import Silly
+from lesssilly import LessSilly
+from oxo import Oxo
+from connect4 import Connect4
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+# The engines to time.  Each searches the given game to the depth in limits, with a new transposition
+# table, and leaves the number of nodes it visited in limits.  mcts runs MCTS_ITERATIONS iterations,
+# whatever the depth, and counts the nodes in its tree
+ENGINES = {
+    "minimax": lambda game, limits: computerMoveMinimax(game, ALG_MINIMAX, None, limits),
+    "alphabeta": lambda game, limits: computerMoveMinimax(game, ALG_ALPHABETA, None, limits),
+    "negamax": lambda game, limits: computerMoveNegamax(game, None, limits),
+    "parallel": lambda game, limits: searchParallel(game, limits),
+    "ybw": lambda game, limits: searchYBW(game, limits),
+    "mcts": lambda game, limits: searchMCTS(game, limits),
+}
+
+# The engines that need a pool of worker processes, and how to start it.  Starting the workers is slow,
+# so each pool is started before its engine is timed and kept for the whole run
+POOLS = {
+    "parallel": lambda: SearchPool(keepTables=False),
+    "ybw": lambda: YBWPool(),
+}
+
+# The positions to search, as (name, new game, moves, depth, engines) tuples.  The moves are played
+# from the start of the game, ending with a player move, so it is always the computer's turn
+POSITIONS = [
+    ("silly-start", Silly, [], 100, ("minimax", "alphabeta", "negamax")),
+    ("lesssilly-start", LessSilly, [], 100, ("minimax", "alphabeta", "negamax")),
+    ("lesssilly-reply", LessSilly, [0], 100, ("minimax", "alphabeta", "negamax")),
+    ("oxo-start", Oxo, [], 9, ("minimax", "alphabeta", "negamax", "parallel", "ybw")),
+    ("oxo-corner", Oxo, [0], 9, ("minimax", "alphabeta", "negamax", "parallel", "ybw")),
+    ("oxo-middlegame", Oxo, [4, 0, 8], 9, ("minimax", "alphabeta", "negamax", "mcts")),
+    ("connect4-start-shallow", Connect4, [], 4, ("minimax",)),
+    ("connect4-start", Connect4, [], 7, ("alphabeta", "negamax", "parallel", "ybw", "mcts")),
+    ("connect4-opening", Connect4, [3, 3, 2], 7, ("alphabeta", "negamax", "parallel", "ybw", "mcts")),
+    ("connect4-stack2d-opening", lambda: Connect4(Stack2D(6, 7)), [3, 3, 2], 6, ("alphabeta", "negamax")),
+]
+
+DEFAULT_TOLERANCE = 0.2         # how much worse than the baseline a result can be before it is flagged
+MIN_COMPARED_SECONDS = 0.01     # searches quicker than this in the baseline are too short to time reliably
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark-baseline.json")
+
+MCTS_ITERATIONS = 2048          # iterations the mcts engine runs
+
+LAZYSMP_MOVES = [3, 3, 2, 4]    # moves leading to the Connect 4 position searched by benchmarkLazySMP()
+LAZYSMP_DEPTH = 8               # deepest search benchmarkLazySMP() times
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+# -------------------------------------------------------------------------------------------------
+
+pools = {}                      # the pools of worker processes started by runBenchmarks(), by engine
+
+
+def searchParallel(game, limits):
+    """Search the root moves in parallel with alpha-beta, each worker starting with an empty table"""
+
+    pool = pools["parallel"]
+    game.maxDepth = limits.maxDepth
+    computerMoveParallel(game, ALG_ALPHABETA, pool)
+    limits.nodes = pool.getStats()["nodes"]
+
+
+def searchYBW(game, limits):
+    """Search with the young brothers wait parallel search, starting with an empty table"""
+
+    pool = pools["ybw"]
+    pool.table.clear()
+    game.maxDepth = limits.maxDepth
+    computerMoveYBW(game, pool)
+    limits.nodes = pool.getStats()["nodes"]
+
+
+def searchMCTS(game, limits):
+    """Search with a new Monte Carlo search tree, seeded so the same tree is grown each time"""
+
+    tree = MCTS(seed=1)
+    tree.search(game, iterations=MCTS_ITERATIONS)
+    limits.nodes = tree.getStats()["nodes"]
+
+
+def setUpPosition(newGame, moves):
+    """Start a game and play the given moves, the last of them by the player"""
+
+    game = newGame()
+    computerTurn = len(moves) % 2 == 0
+    for move in moves:
+        game.applyMove(move, computerTurn)
+        computerTurn = not computerTurn
+
+    return game
+
+
+def runSearch(engine, game, depth, repeat=1):
+    """
+    Time the given engine searching game to the given depth.
+    The search is run repeat times and the fastest is kept, then once more to measure the peak
+    memory, since tracing memory slows the search down.
+    Returns a dictionary of the results.
+    """
+
+    seconds = None
+    for run in range(repeat):
+        limits = SearchLimits(depth)
+        start = time.perf_counter()
+        ENGINES[engine](game.copy(), limits)
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+
+    tracemalloc.start()
+    ENGINES[engine](game.copy(), SearchLimits(depth))
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "nodes": limits.nodes,
+        "seconds": seconds,
+        "nodesPerSecond": limits.nodes / seconds if seconds > 0 else 0.0,
+        "peakMemory": peakMemory,
+    }
+
+
+def runBenchmarks(repeat=1, only=None):
+    """
+    Run every engine on every position in the catalogue, printing the results as they come.
+    only, if given, limits the run to positions or engines whose names contain it.
+    Returns a list of result dictionaries.
+    """
+
+    runs = [(name, newGame, moves, depth, engine) for name, newGame, moves, depth, engines in POSITIONS for engine in engines
+            if only is None or only in name or only in engine]
+    for engine in set(run[4] for run in runs) & POOLS.keys():
+        pools[engine] = POOLS[engine]()
+
+    print("{:<26} {:<10} {:>5} {:>10} {:>12} {:>9} {:>11}".format(
+        "Position", "Engine", "Depth", "Nodes", "Nodes/sec", "Time", "Peak memory"))
+    results = []
+    try:
+        for name, newGame, moves, depth, engine in runs:
+            game = setUpPosition(newGame, moves)
+            result = {"position": name, "engine": engine, "depth": depth}
+            result.update(runSearch(engine, game, depth, repeat))
+            print("{position:<26} {engine:<10} {depth:>5} {nodes:>10} {nodesPerSecond:>12.0f} {seconds:>8.3f}s {peakMemory:>10}B".format(**result))
+            results.append(result)
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+        pools.clear()
+
+    return results
+
+
+def saveResults(path, results):
+    """Save the results to a JSON file, with details of where they were run"""
+
+    with open(path, "w") as resultsFile:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "results": results,
+        }, resultsFile, indent=2)
+
+
+def compareResults(results, baselinePath, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare the results with those saved in the baseline file, printing any regressions: searches
+    that took longer, visited more nodes or used more memory than the baseline by more than tolerance.
+    Times under MIN_COMPARED_SECONDS in the baseline aren't compared.
+    Returns the number of regressions.
+    """
+
+    with open(baselinePath) as baselineFile:
+        baseline = {(result["position"], result["engine"], result["depth"]): result
+                    for result in json.load(baselineFile)["results"]}
+
+    regressions = 0
+    for result in results:
+        before = baseline.get((result["position"], result["engine"], result["depth"]))
+        if before is None:
+            continue
+        for measure in ("seconds", "nodes", "peakMemory"):
+            if measure == "seconds" and before[measure] < MIN_COMPARED_SECONDS:
+                continue
+            if result[measure] > before[measure] * (1 + tolerance):
+                print("Regression: {} {} {} went from {} to {}".format(
+                    result["position"], result["engine"], measure, before[measure], result[measure]))
+                regressions += 1
+
+    if regressions == 0:
+        print("No regressions against {}".format(baselinePath))
+
+    return regressions
+
+
+def timeToDepth(search, game, depth):
+    """
+    Time search(game), with game searching depth plies ahead.
+    Each search starts from an empty table, so earlier runs don't help it.
+    Returns the time taken in seconds.
+    """
+
+    game = game.copy()
+    game.maxDepth = depth
+    start = time.perf_counter()
+    search(game)
+    return time.perf_counter() - start
+
+
+def benchmarkLazySMP(workers=None, maxDepth=LAZYSMP_DEPTH):
+    """
+    Print the time Lazy SMP and a single process take to search the same position to each depth.
+    Returns a list of (depth, single process time, Lazy SMP time) tuples.
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    game = setUpPosition(Connect4, LAZYSMP_MOVES)
+
+    def single(game):
+        computerMoveIterative(game, ALG_ALPHABETA, table=TranspositionTable())
+
+    def lazySMP(game):
+        with SharedTranspositionTable() as table:
+            computerMoveLazySMP(game, workers, table=table)
+
+    print("Time to depth, 1 process against Lazy SMP with {} workers".format(workers))
+    print("{:>5}  {:>10}  {:>10}  {:>7}".format("Depth", "1 process", "Lazy SMP", "Speedup"))
+    results = []
+    for depth in range(1, maxDepth + 1):
+        singleTime = timeToDepth(single, game, depth)
+        lazySMPTime = timeToDepth(lazySMP, game, depth)
+        print("{:>5}  {:>9.3f}s  {:>9.3f}s  {:>6.2f}x".format(depth, singleTime, lazySMPTime, singleTime / lazySMPTime))
+        results.append((depth, singleTime, lazySMPTime))
+
+    return results
+
+
+# -------------------------------------------------------------------------------------------------
+# Main program
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the search algorithms")
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="compare the results with this saved JSON file (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="time each search this many times and keep the fastest")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="fraction worse than the baseline to allow")
+    parser.add_argument("--only", help="only run positions or engines whose names contain this")
+    parser.add_argument("--lazysmp", nargs="?", type=int, const=0, metavar="WORKERS", help="run the Lazy SMP time to depth benchmark instead")
+    arguments = parser.parse_args()
+
+    if arguments.lazysmp is not None:
+        benchmarkLazySMP(arguments.lazysmp or None)
+        sys.exit(0)
+
+    # Compare before saving, so a new baseline can be saved over the old one and compared with it
+    results = runBenchmarks(arguments.repeat, arguments.only)
+    regressions = 0
+    if not os.path.exists(arguments.baseline):
+        print("No baseline at {} to compare with".format(arguments.baseline))
+    else:
+        regressions = compareResults(results, arguments.baseline, arguments.tolerance)
+    if arguments.output:
+        saveResults(arguments.output, results)
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,183 @@
+"""
+Connect4
+
+A Connect 4 game, played on a bitboard
+"""
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+from minimaxdebug import play
+from minimaxdebug import ALG_ALPHABETA, ALG_RANDOM
+from gamestate import *
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+ROWS = 6  # number of rows in the grid
+COLS = 7  # number of cols in the grid
+RUNLENGTH = 4  # length of a run that the winner needs to make
+MAXDEPTH = 6  # maximum depth we want the minimax algorithm to search
+
+
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
+
+class Connect4:
+    """The Connect4 class implements the functionality required by the minimax algorithm"""
+
+    def __init__(self, state=None):
+        """Set up the initial state of the game board"""
+
+        if state is None:
+            self.state = BitStack2D(ROWS, COLS)  # if no state was provided set it up with an empty state
+            self.state.flipped = True  # show the bottom of the stacks at the bottom of the screen
+        else:
+            self.state = state  # if a state was provided, set it up with that state
+        self.maxDepth = MAXDEPTH
+
+    def playerMove(self):
+        """Get a move from the player"""
+
+        self.show()
+
+        # Allow the player to select a move
+        while True:
+            try:
+                move = int(input("Your move (0-{}):".format(COLS - 1)))
+                if self.isValidMove(move):
+                    self.applyMove(move, False)
+                    break
+                else:
+                    print("Invalid move")
+            except ValueError:
+                print("Please enter a number between 0 and {}".format(COLS - 1))
+
+        self.show()
+
+    def isValidMove(self, move):
+        """Is the given move valid?  Checks that the stack is not full"""
+
+        return 0 <= move < COLS and not self.state.stackIsFull(move)
+
+    def getPossibleMoves(self):
+        """Get a list of all possible moves from the current game state"""
+
+        return self.state.getNonFullStacks()
+
+    def orderMoves(self, moves):
+        """Return the given moves, most promising first"""
+
+        return self.state.orderStacks(moves)
+
+    def applyMove(self, move, computerTurn):
+        """Apply the given move"""
+
+        self.state.addToStack(move, 'X' if computerTurn else 'O')
+
+    def undoMove(self, move):
+        """Undo the given move, which must be the last move applied"""
+
+        self.state.removeFromStack(move)
+
+    def getScore(self):
+        """
+        Get the score for the current game state.
+        The score is returned as a tuple (TSCOREVALUE, TGAMEOVER).
+        A TSCOREVALUE of 100 means computer wins.
+        A TSCOREVALUE of -100 means player wins.
+        A TSCOREVALUE of 0 means it is a draw, or the game is not over yet.
+        TGAMEOVER is True if we have reached the end of the game, False otherwise
+        """
+
+        board = self.state
+
+        # Only the lines through the last move can have been won, if we know what it was.
+        # Otherwise check all the lines on the board
+        if board.lastMove is None:
+            winner = board.winner(RUNLENGTH)
+        elif board.lastMoveWins(RUNLENGTH):
+            winner = board.getCell(*board.lastMove)
+        else:
+            winner = None
+
+        # Check for computer win
+        if winner == 'X':
+            return (100, True)
+
+        # Check for player win
+        if winner == 'O':
+            return (-100, True)
+
+        # Check if grid full, i.e. it's a draw
+        if board.boardIsFull():
+            return (0, True)
+
+        # Game still not over
+        return (0, False)
+
+    def show(self):
+        """Show the state of the board on the screen"""
+
+        self.state.show()
+
+    def copy(self):
+        """Return a copy of this game state"""
+
+        return Connect4(self.state.copy())
+
+    def getSymmetries(self):
+        """Return the transforms that leave the current game state unchanged"""
+
+        return self.state.getSymmetries()
+
+    def transformMove(self, move, transform):
+        """Return the move that the given transform maps the given move onto"""
+
+        return self.state.transformStack(move, transform)
+
+    def getKey(self):
+        """Return a hashable value that identifies the current game state"""
+
+        return self.state.zobristKey
+
+    def getRunLength(self):
+        """Return the length of run on the board that wins the game"""
+
+        return RUNLENGTH
+
+    def prettyPath(self, path):
+        """
+        Show the evaluation path neatly formatted.
+        path is a list of (bestScore, game, level) tuples
+        """
+
+        # Print the score for each state in the path
+        print("      ", end="")
+        for scoreState in path:
+            bestScore = scoreState[0]
+            print("{:<7}".format(bestScore), " ", end="")
+        print("")
+
+        # Print the board for each state in the path, top row first.  We need to print all states one row at a time
+        for row in range(ROWS - 1, -1, -1):
+            print("      ", end="")
+            for scoreState in path:
+                game = scoreState[1]
+                for col in range(0, COLS):
+                    print(game.state.getCell(row, col), end="")
+                print("  ", end="")
+            print("")
+        print("")
+
+
+# -------------------------------------------------------------------------------------------------
+# Main program
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    game = Connect4()
+    play(game, ALG_ALPHABETA)
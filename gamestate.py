@@ -2,25 +2,233 @@
 # gamestate.py
 # -------------------------------------------------------------------------------------------------
 
+import random
 import numpy as np
 
+# -------------------------------------------------------------------------------------------------
+# Cell values
+# -------------------------------------------------------------------------------------------------
+
+EMPTY = 0                                                                                           # code stored in the grid for an empty cell
+CELL_VALUES = ('_', 'X', 'O')                                                                       # cell value for each code stored in the grid
+CELL_CODES = {'_': 0, 'X': 1, 'O': 2}                                                               # code stored in the grid for each cell value
+
+
+def encodeGrid(grid):
+    """
+    Convert a grid of cell values ('_', 'X', 'O') into the int8 codes the boards store.
+    A grid that already holds codes is returned as it is.
+    """
+
+    grid = np.asarray(grid)
+    if grid.dtype == np.int8:
+        return grid
+
+    codes = np.zeros(grid.shape, dtype=np.int8)
+    for value, code in CELL_CODES.items():
+        codes[grid == value] = code
+
+    return codes
+
+
+# -------------------------------------------------------------------------------------------------
+# Zobrist keys
+# -------------------------------------------------------------------------------------------------
+
+_zobristTables = {}                                                                                 # (rows, cols, value) -> keys
+
+
+def zobristTable(rows, cols, value):
+    """
+    Get the table of random 64-bit numbers, one per cell, used to hash the given cell value.
+    The numbers are seeded from the board size and value so they are the same on every run,
+    which lets keys be saved to disk or shared between processes.
+    An empty cell contributes nothing, so an empty board always has a key of 0.
+    """
+
+    table = _zobristTables.get((rows, cols, value))
+    if table is None:
+        generator = random.Random("zobrist {}x{} {}".format(rows, cols, value))
+        table = [[generator.getrandbits(64) for col in range(cols)] for row in range(rows)]
+        _zobristTables[(rows, cols, value)] = table
+
+    return table
+
+
+# -------------------------------------------------------------------------------------------------
+# Winning lines
+# -------------------------------------------------------------------------------------------------
+
+_lineTables = {}                                                                                    # (rows, cols, runLength) -> lines
+_cellLineTables = {}                                                                                # (rows, cols, runLength) -> lines through each cell
+
+SMALL_BATCH = 1024          # most boards BoardBatch.lastMoveWins() checks all the lines of in one go
+
+
+def lineTable(rows, cols, runLength):
+    """
+    Get every line of runLength cells on a rows x cols board, horizontal, vertical and both diagonals.
+    The result is an array with one row per line holding the flat grid index of each cell in it,
+    so grid.ravel()[lines] gives the contents of every line at once.
+    """
+
+    lines = _lineTables.get((rows, cols, runLength))
+    if lines is None:
+        cells = np.arange(rows * cols).reshape(rows, cols)
+        steps = np.arange(runLength)
+        lines = []
+        for rowStep, colStep in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for row in range(rows):
+                for col in range(cols):
+                    endRow = row + rowStep * (runLength - 1)
+                    endCol = col + colStep * (runLength - 1)
+                    if 0 <= endRow < rows and 0 <= endCol < cols:
+                        lines.append(cells[row + rowStep * steps, col + colStep * steps])
+        lines = np.array(lines, dtype=np.intp).reshape(-1, runLength)
+        _lineTables[(rows, cols, runLength)] = lines
+
+    return lines
+
+
+def cellLineTable(rows, cols, runLength):
+    """
+    Get the lines of lineTable() that pass through each cell of a rows x cols board.
+    The result is an array indexed by flat grid index, then line, then position along the line,
+    holding the flat grid index of each cell in each line through that cell.  Cells with fewer lines
+    than the most through any cell are padded with lines of -1.
+    """
+
+    cellLines = _cellLineTables.get((rows, cols, runLength))
+    if cellLines is None:
+        linesThrough = [[] for cell in range(rows * cols)]
+        for line in lineTable(rows, cols, runLength):
+            for cell in line:
+                linesThrough[cell].append(line)
+        cellLines = np.full((rows * cols, max(len(lines) for lines in linesThrough), runLength), -1, dtype=np.intp)
+        for cell, lines in enumerate(linesThrough):
+            cellLines[cell, :len(lines)] = lines
+        _cellLineTables[(rows, cols, runLength)] = cellLines
+
+    return cellLines
+
+
+# -------------------------------------------------------------------------------------------------
+# Symmetries
+# -------------------------------------------------------------------------------------------------
+
+# A transform is a number from 0 to 7: transform % 4 quarter turns anticlockwise, then for 4 and
+# above a mirror image, swapping left and right
+IDENTITY = 0        # the transform that leaves a board as it is
+MIRROR = 4          # the transform that swaps left and right, the only symmetry of a board of stacks
+
+_cellMaps = {}                                                                                      # (rows, cols, transform) -> cell map
+
+
+def transformGrid(grid, transform):
+    """Apply the given transform to a grid, returning a view of it"""
+
+    grid = np.rot90(grid, transform % 4)
+    if transform >= MIRROR:
+        grid = grid[:, ::-1]
+
+    return grid
+
+
+def inverseTransform(transform):
+    """Get the transform that undoes the given transform"""
+
+    if transform >= MIRROR:
+        return transform                                                                            # mirror images undo themselves
+
+    return (4 - transform) % 4
+
+
+def transformCell(rows, cols, row, col, transform):
+    """Get the (row, col) that the cell at (row, col) of a rows x cols grid moves to under the given transform"""
+
+    cellMap = _cellMaps.get((rows, cols, transform))
+    if cellMap is None:
+        sources = transformGrid(np.arange(rows * cols).reshape(rows, cols), transform)
+        newCols = sources.shape[1]
+        cellMap = [None] * (rows * cols)
+        for index, source in enumerate(sources.ravel()):
+            cellMap[source] = divmod(index, newCols)
+        _cellMaps[(rows, cols, transform)] = cellMap
+
+    return cellMap[row * cols + col]
+
+
+def canonicalTransform(grid, transforms):
+    """
+    Of the given transforms, find the one that turns grid into its canonical form: the transformed
+    grid that comes first when their codes are compared in order.  Boards that are symmetries of each
+    other have the same canonical form.
+    """
+
+    bestTransform = None
+    bestCodes = None
+    for transform in transforms:
+        codes = transformGrid(grid, transform).tobytes()
+        if bestCodes is None or codes < bestCodes:
+            bestCodes = codes
+            bestTransform = transform
+
+    return bestTransform
+
 
 class Board2D:
     """
     A class to represent a general 2D game board.
     E.g. this can be used for Noughts and Crosses.
+    Cells hold '_', 'X' or 'O', but the grid stores them as int8 codes (see CELL_CODES), which are
+    much quicker to compare.  Methods take and return the cell values.
     """
 
-    def __init__(self, rows, cols, grid=None):
-        """Set the board up"""
+    def __init__(self, rows, cols, grid=None, zobristKey=None):
+        """
+        Set the board up.
+        grid can hold either cell values or codes.
+        zobristKey is the key for the given grid if it is already known, e.g. when copying.
+        """
 
         self.rows = rows
         self.cols = cols
+        self.zobristTables = (None, zobristTable(rows, cols, 'X'), zobristTable(rows, cols, 'O'))   # indexed by code
         if grid is None:
-            self.grid = np.full((rows, cols), '_')
+            self.grid = np.full((rows, cols), EMPTY, dtype=np.int8)
+            self._zobristKey = 0
         else:
-            self.grid = grid
+            self.grid = encodeGrid(grid)
+            self._zobristKey = self.computeZobristKey() if zobristKey is None else zobristKey
         self.flipped = False
+        self.lastMove = None                                                                        # (row, col) of the last piece placed
+        self.earlierMoves = []                                                                      # lastMove before each piece placed, for undoing
+
+    @property
+    def zobristKey(self):
+        """
+        A 64-bit key identifying the contents of the board.
+        It is kept up to date by setCell(), so cells should not be changed through grid directly.
+        """
+
+        return self._zobristKey
+
+    def computeZobristKey(self):
+        """Calculate the Zobrist key of the board from scratch"""
+
+        key = 0
+        for row in range(self.rows):
+            for col in range(self.cols):
+                code = self.grid[row, col]
+                if code != EMPTY:
+                    key ^= self.zobristTables[code][row][col]
+
+        return key
+
+    def getStringGrid(self):
+        """Get the board as a numpy array of cell values rather than codes"""
+
+        return np.array(CELL_VALUES)[self.grid]
 
     def show(self):
         """Show the state on the screen"""
@@ -34,21 +242,52 @@ class Board2D:
             endRow = self.rows
             increment = 1
 
+        grid = self.getStringGrid()
         for row in range(startRow, endRow, increment):
             for col in range(0, self.cols):
-                print(self.grid[row, col], " ", end="")
+                print(grid[row, col], " ", end="")
             print("")
         print("")
 
     def setCell(self, row, col, value):
         """Set the value of the given cell"""
 
-        self.grid[row, col] = value
+        # Update the key by removing the old value and adding the new one
+        code = CELL_CODES[value]
+        oldCode = self.grid[row, col]
+        if oldCode != EMPTY:
+            self._zobristKey ^= self.zobristTables[oldCode][row][col]
+        if code != EMPTY:
+            self._zobristKey ^= self.zobristTables[code][row][col]
+
+        self.grid[row, col] = code
+        self.updateLastMove(row, col, code != EMPTY)
+
+    def updateLastMove(self, row, col, placed):
+        """
+        Keep lastMove up to date after the given cell has been set.  Emptying the cell of the last
+        piece placed, as undoing a move does, brings back the move before it.  Emptying any other
+        cell leaves the last move unknown.
+        """
+
+        if placed:
+            self.earlierMoves.append(self.lastMove)
+            self.lastMove = (row, col)
+        elif self.lastMove == (row, col) and self.earlierMoves:
+            self.lastMove = self.earlierMoves.pop()
+        else:
+            self.lastMove = None
+            self.earlierMoves = []
+
+    def clearCell(self, row, col):
+        """Empty the given cell, e.g. to undo a move"""
+
+        self.setCell(row, col, '_')
 
     def getCell(self, row, col):
         """Get the value of the given cell"""
 
-        return self.grid[row, col]
+        return CELL_VALUES[self.grid[row, col]]
 
     def isHorizRun(self, row, col, runLength, value):
         """
@@ -59,7 +298,7 @@ class Board2D:
         possibleRun = self.grid[row, col:col + runLength]  # slice board so that desired starting point is top left
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and np.all(possibleRun == value)
+        return len(possibleRun) == runLength and np.all(possibleRun == CELL_CODES[value])
 
     def isVertRun(self, row, col, runLength, value):
         """
@@ -70,7 +309,7 @@ class Board2D:
         possibleRun = self.grid[row:row + runLength, col]  # slice board so that desired starting point is top left
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and np.all(possibleRun == value)
+        return len(possibleRun) == runLength and np.all(possibleRun == CELL_CODES[value])
 
     def isDiagRun(self, row, col, runLength, value):
         """
@@ -84,7 +323,7 @@ class Board2D:
         possibleRun = diagonal[0:runLength]  # slice diagnonal down to desired run length
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and np.all(possibleRun == value)
+        return len(possibleRun) == runLength and np.all(possibleRun == CELL_CODES[value])
 
     def isReverseDiagRun(self, row, col, runLength, value):
         """
@@ -100,7 +339,7 @@ class Board2D:
         possibleRun = diagonal[0:runLength]  # slice diagnonal down to desired run length
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and np.all(possibleRun == value)
+        return len(possibleRun) == runLength and np.all(possibleRun == CELL_CODES[value])
 
     def isHorizStreak(self, row, col, runLength, value, streakLength):
         """
@@ -111,8 +350,8 @@ class Board2D:
         possibleRun = self.grid[row, col:col + runLength]  # slice board so that desired starting point is top left
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and (possibleRun == value).sum() == streakLength and (
-                    possibleRun == '_').sum() == runLength - streakLength
+        return len(possibleRun) == runLength and (possibleRun == CELL_CODES[value]).sum() == streakLength and (
+                    possibleRun == EMPTY).sum() == runLength - streakLength
 
     def isVertStreak(self, row, col, runLength, value, streakLength):
         """
@@ -123,8 +362,8 @@ class Board2D:
         possibleRun = self.grid[row:row + runLength, col]  # slice board so that desired starting point is top left
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and (possibleRun == value).sum() == streakLength and (
-                    possibleRun == '_').sum() == runLength - streakLength
+        return len(possibleRun) == runLength and (possibleRun == CELL_CODES[value]).sum() == streakLength and (
+                    possibleRun == EMPTY).sum() == runLength - streakLength
 
     def isDiagStreak(self, row, col, runLength, value, streakLength):
         """
@@ -138,8 +377,8 @@ class Board2D:
         possibleRun = diagonal[0:runLength]  # slice diagnonal down to desired run length
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and (possibleRun == value).sum() == streakLength and (
-                    possibleRun == '_').sum() == runLength - streakLength
+        return len(possibleRun) == runLength and (possibleRun == CELL_CODES[value]).sum() == streakLength and (
+                    possibleRun == EMPTY).sum() == runLength - streakLength
 
     def isReverseDiagStreak(self, row, col, runLength, value, streakLength):
         """
@@ -155,27 +394,136 @@ class Board2D:
         possibleRun = diagonal[0:runLength]  # slice diagnonal down to desired run length
 
         # Check if we have a run of the right length and right value
-        return len(possibleRun) == runLength and (possibleRun == value).sum() == streakLength and (
-                    possibleRun == '_').sum() == runLength - streakLength
+        return len(possibleRun) == runLength and (possibleRun == CELL_CODES[value]).sum() == streakLength and (
+                    possibleRun == EMPTY).sum() == runLength - streakLength
+
+    def lastMoveWins(self, runLength):
+        """
+        Did the last piece placed with setCell complete a run of runLength cells.
+        Only the lines through that cell are checked, so this assumes nobody had already won before it.
+        Returns False if there is no last move, e.g. after a cell has been cleared.
+        """
+
+        if self.lastMove is None:
+            return False
+
+        row, col = self.lastMove
+        grid = self.grid
+        code = grid[row, col]
+        for rowStep, colStep in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            # Count the matching cells running away from the last move in both directions
+            length = 1
+            for direction in (1, -1):
+                nextRow = row + rowStep * direction
+                nextCol = col + colStep * direction
+                while 0 <= nextRow < self.rows and 0 <= nextCol < self.cols and grid[nextRow, nextCol] == code:
+                    length += 1
+                    nextRow += rowStep * direction
+                    nextCol += colStep * direction
+            if length >= runLength:
+                return True
+
+        return False
+
+    def findRuns(self, runLength, value):
+        """
+        Find all runs of runLength cells of the same value, in any direction, in one go.
+        Returns an array with one row per run holding the flat grid index of each cell in it.
+        """
+
+        lines = lineTable(self.rows, self.cols, runLength)
+        isRun = np.all(self.grid.ravel()[lines] == CELL_CODES[value], axis=1)
+
+        return lines[isRun]
+
+    def hasRun(self, runLength, value):
+        """Do we have a run of runLength cells of the same value anywhere on the board"""
+
+        lines = lineTable(self.rows, self.cols, runLength)
+        return bool(np.any(np.all(self.grid.ravel()[lines] == CELL_CODES[value], axis=1)))
+
+    def winner(self, runLength):
+        """
+        Get the value which has a run of runLength cells anywhere on the board, or None.
+        If more than one value has a run, the one whose run comes first is returned.
+        """
+
+        lineCells = self.grid.ravel()[lineTable(self.rows, self.cols, runLength)]
+        firstCells = lineCells[:, 0]
+        isRun = np.all(lineCells == firstCells[:, np.newaxis], axis=1) & (firstCells != EMPTY)
+        if not isRun.any():
+            return None
+
+        return CELL_VALUES[firstCells[np.argmax(isRun)]]
 
     def boardIsFull(self):
         """Check if the board is full"""
 
-        return len(self.grid[self.grid == '_']) == 0
+        return np.count_nonzero(self.grid) == self.rows * self.cols
 
     def getAvailableCells(self):
-        """Cells numbered in sequence starting with 0 in top left"""
+        """Empty cells numbered in sequence starting with 0 in top left, along the rows"""
+
+        return np.flatnonzero(self.grid == EMPTY)
+
+    def rank(self):
+        """
+        Number the board by reading its cell codes as the digits of a base 3 number, cell (0, 0) the
+        least significant.  Every board of this size has a different rank, from 0 up to 3 ** (rows * cols) - 1.
+        """
 
-        allMoves = np.arange(0, 9).reshape(3, 3)  # generate a 3x3 array with position numbers 0 to 8
-        options = np.where(self.grid == '_', allMoves,
-                           self.grid)  # find all empty squares and replace with position number 0 to 8
-        options = options[options != 'O']  # remove all O moves
-        options = options[options != 'X']  # remove all X moves
-        options = options.astype(np.int)  # convert from string to int
-        return options
+        rank = 0
+        for code in reversed(self.grid.ravel().tolist()):
+            rank = rank * 3 + code
+
+        return rank
+
+    def symmetries(self):
+        """Get the transforms that map the shape of the board onto itself: all 8 if it is square, otherwise 4"""
+
+        if self.rows == self.cols:
+            return range(8)
+
+        return (0, 2, 4, 6)
+
+    def getSymmetries(self):
+        """Get the transforms that leave the board exactly as it is, always including IDENTITY"""
+
+        return [transform for transform in self.symmetries() if np.array_equal(transformGrid(self.grid, transform), self.grid)]
+
+    def transformCell(self, row, col, transform):
+        """Get the (row, col) that the given cell moves to under the given transform"""
+
+        return transformCell(self.rows, self.cols, row, col, transform)
+
+    def transformed(self, transform):
+        """Return a copy of the board with the given transform applied"""
+
+        board = Board2D(self.rows, self.cols, np.ascontiguousarray(transformGrid(self.grid, transform)))
+        board.flipped = self.flipped
+        return board
+
+    def canonicalForm(self):
+        """
+        Get the canonical form of the board, which is the same for all boards that are symmetries of
+        each other, so it can be used to store them once, e.g. in an opening book.
+        Returns a (board, transform) tuple, where transform turns this board into the canonical one and
+        inverseTransform(transform) turns the canonical board, and cells on it, back into this one.
+        """
+
+        transform = canonicalTransform(self.grid, self.symmetries())
+        return self.transformed(transform), transform
+
+    def canonicalKey(self):
+        """Get the Zobrist key of the canonical form of the board"""
+
+        return self.canonicalForm()[0].zobristKey
 
     def copy(self):
-        return Board2D(self.rows, self.cols, self.grid.copy())
+        board = Board2D(self.rows, self.cols, self.grid.copy(), self._zobristKey)
+        board.lastMove = self.lastMove
+        board.earlierMoves = self.earlierMoves.copy()
+        return board
 
 
 class Stack2D(Board2D):
@@ -184,10 +532,10 @@ class Stack2D(Board2D):
     E.g. this can be used for Connect 4.
     """
 
-    def __init__(self, rows, cols, grid=None, stackHeight=None):
+    def __init__(self, rows, cols, grid=None, stackHeight=None, zobristKey=None):
         """Set the board up"""
 
-        super().__init__(rows, cols, grid)
+        super().__init__(rows, cols, grid, zobristKey)
         if stackHeight is None:
             self.stackHeight = [0] * self.cols
         else:
@@ -228,6 +576,11 @@ class Stack2D(Board2D):
 
         return stacks
 
+    def orderStacks(self, stacks):
+        """Sort the given stacks so those nearest the middle come first, as they are part of the most runs"""
+
+        return sorted(stacks, key=lambda stack: abs(2 * stack - (self.cols - 1)))
+
     def addToStack(self, stack, value):
         """Add the piece 'value' to the given stack"""
 
@@ -235,8 +588,531 @@ class Stack2D(Board2D):
         super().setCell(row, stack, value)
         self.stackHeight[stack] += 1
 
+    def removeFromStack(self, stack):
+        """Remove the top piece from the given stack, e.g. to undo a move.  Returns the piece removed"""
+
+        self.stackHeight[stack] -= 1
+        row = self.stackHeight[stack]
+        value = self.getCell(row, stack)
+        super().setCell(row, stack, '_')
+
+        return value
+
+    def symmetries(self):
+        """Get the transforms that keep the stacks upright, which is just swapping left and right"""
+
+        return (IDENTITY, MIRROR)
+
+    def transformStack(self, stack, transform):
+        """Get the stack that the given stack moves to under the given transform"""
+
+        return self.cols - 1 - stack if transform == MIRROR else stack
+
+    def transformed(self, transform):
+        """Return a copy of the board with the given transform applied"""
+
+        stackHeight = [self.stackHeight[self.transformStack(stack, transform)] for stack in range(self.cols)]
+        board = Stack2D(self.rows, self.cols, np.ascontiguousarray(transformGrid(self.grid, transform)), stackHeight)
+        board.flipped = self.flipped
+        return board
+
     def copy(self):
-        return Stack2D(self.rows, self.cols, self.grid.copy(), self.stackHeight.copy())
+        board = Stack2D(self.rows, self.cols, self.grid.copy(), self.stackHeight.copy(), self._zobristKey)
+        board.lastMove = self.lastMove
+        board.earlierMoves = self.earlierMoves.copy()
+        return board
+
+
+class BitStack2D:
+    """
+    A bitboard version of Stack2D for two player games such as Connect 4.
+    It has the same public methods as Stack2D, but instead of a grid of strings the board is held as
+    one integer per player with a bit set for each cell that player occupies, plus the stack heights.
+
+    Cells are numbered up each stack in turn, with one spare bit at the top of every stack that is
+    always 0.  So cell (row, col) is bit col * (rows + 1) + row, and shifting a bitboard by
+    1, rows, rows + 1 or rows + 2 lines each cell up with its vertical, reverse diagonal, horizontal
+    or diagonal neighbour; the spare bits stop lines wrapping from one stack into the next.
+    """
+
+    PIECES = ('X', 'O')                                                                             # the value for each player's bitboard
+
+    def __init__(self, rows, cols, grid=None, stackHeight=None, zobristKey=None):
+        """
+        Set the board up.
+        grid and stackHeight are as for Stack2D and are converted into bitboards.
+        zobristKey is accepted for compatibility with Stack2D; the key is always calculated from grid.
+        """
+
+        self.rows = rows
+        self.cols = cols
+        self.flipped = False
+        self.stackSize = rows + 1                                                                   # bits per stack, including the spare bit
+        self.shifts = (1, self.stackSize, rows, self.stackSize + 1)                                 # vertical, horizontal and both diagonals
+        self.bits = [0, 0]
+        self.stackHeight = [0] * cols
+        self._zobristKey = 0
+        self.lastMove = None                                                                        # (row, col) of the last piece placed
+        self.earlierMoves = []                                                                      # lastMove before each piece placed, for undoing
+
+        if grid is not None:
+            grid = encodeGrid(grid)
+            for row in range(rows):
+                for col in range(cols):
+                    if grid[row, col] != EMPTY:
+                        self.setCell(row, col, CELL_VALUES[grid[row, col]])
+            if stackHeight is None:
+                stackHeight = [int(np.count_nonzero(grid[:, col])) for col in range(cols)]
+            self.lastMove = None
+            self.earlierMoves = []
+        if stackHeight is not None:
+            self.stackHeight = stackHeight
+
+    @property
+    def zobristKey(self):
+        """A 64-bit key identifying the contents of the board, the same as Board2D would give"""
+
+        return self._zobristKey
+
+    @property
+    def grid(self):
+        """The board as a numpy array of cell codes, as used by Board2D"""
+
+        # Unpack each player's bits, one column of the array per stack, then drop the spare bits
+        size = self.cols * self.stackSize
+        grid = np.zeros((self.rows, self.cols), dtype=np.int8)
+        for value, bits in zip(self.PIECES, self.bits):
+            cells = np.unpackbits(np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8), count=size, bitorder="little")
+            grid += cells.reshape(self.cols, self.stackSize)[:, :self.rows].T.astype(np.int8) * CELL_CODES[value]
+
+        return grid
+
+    def getStringGrid(self):
+        """Get the board as a numpy array of cell values rather than codes"""
+
+        return np.array(CELL_VALUES)[self.grid]
+
+    def show(self):
+        """Show the state on the screen"""
+
+        if self.flipped:
+            rows = range(self.rows - 1, -1, -1)
+        else:
+            rows = range(0, self.rows)
+
+        for row in rows:
+            for col in range(0, self.cols):
+                print(self.getCell(row, col), " ", end="")
+            print("")
+        print("")
+
+    def cellBit(self, row, col):
+        """Get the bitboard bit for the given cell"""
+
+        return 1 << (col * self.stackSize + row)
+
+    def setCell(self, row, col, value):
+        """Set the value of the given cell"""
+
+        bit = self.cellBit(row, col)
+        oldValue = self.getCell(row, col)
+        if oldValue != '_':
+            self.bits[self.PIECES.index(oldValue)] &= ~bit
+            self._zobristKey ^= zobristTable(self.rows, self.cols, oldValue)[row][col]
+        if value != '_':
+            self.bits[self.PIECES.index(value)] |= bit
+            self._zobristKey ^= zobristTable(self.rows, self.cols, value)[row][col]
+        self.updateLastMove(row, col, value != '_')
+
+    def updateLastMove(self, row, col, placed):
+        """Keep lastMove up to date after the given cell has been set, as Board2D.updateLastMove() does"""
+
+        if placed:
+            self.earlierMoves.append(self.lastMove)
+            self.lastMove = (row, col)
+        elif self.lastMove == (row, col) and self.earlierMoves:
+            self.lastMove = self.earlierMoves.pop()
+        else:
+            self.lastMove = None
+            self.earlierMoves = []
+
+    def getCell(self, row, col):
+        """Get the value of the given cell"""
+
+        bit = self.cellBit(row, col)
+        if self.bits[0] & bit:
+            return self.PIECES[0]
+        if self.bits[1] & bit:
+            return self.PIECES[1]
+        return '_'
+
+    def lineMask(self, row, col, runLength, rowStep, colStep):
+        """
+        Get a bitboard with the cells of the line starting at row,col set.
+        Returns 0 if the line runs off the board.
+        """
+
+        endRow = row + rowStep * (runLength - 1)
+        endCol = col + colStep * (runLength - 1)
+        if not (0 <= row < self.rows and 0 <= col < self.cols and 0 <= endRow < self.rows and 0 <= endCol < self.cols):
+            return 0
+
+        mask = 0
+        for step in range(runLength):
+            mask |= self.cellBit(row + rowStep * step, col + colStep * step)
+
+        return mask
+
+    def isLineRun(self, mask, value):
+        """Are all the cells in the mask set to value"""
+
+        bits = self.bits[self.PIECES.index(value)]
+        return mask != 0 and bits & mask == mask
+
+    def isLineStreak(self, mask, value, streakLength):
+        """Are exactly streakLength cells in the mask set to value, with the rest empty"""
+
+        bits = self.bits[self.PIECES.index(value)]
+        occupied = self.bits[0] | self.bits[1]
+        return mask != 0 and (bits & mask).bit_count() == streakLength and (occupied & mask).bit_count() == streakLength
+
+    def isHorizRun(self, row, col, runLength, value):
+        """Do we have a horizontal run of the same value starting at row,col"""
+
+        return self.isLineRun(self.lineMask(row, col, runLength, 0, 1), value)
+
+    def isVertRun(self, row, col, runLength, value):
+        """Do we have a vertical run of the same value starting at row,col"""
+
+        return self.isLineRun(self.lineMask(row, col, runLength, 1, 0), value)
+
+    def isDiagRun(self, row, col, runLength, value):
+        """Do we have a diagonal run of the same value starting at row,col"""
+
+        return self.isLineRun(self.lineMask(row, col, runLength, 1, 1), value)
+
+    def isReverseDiagRun(self, row, col, runLength, value):
+        """
+        Do we have a reverse diagonal run of the same value starting at row,col.
+        The row number provided should be the lowest in the possible run
+        """
+
+        return self.isLineRun(self.lineMask(row, col, runLength, 1, -1), value)
+
+    def isHorizStreak(self, row, col, runLength, value, streakLength):
+        """Do we have a horizontal streak, i.e. n out of m of the same value starting at row,col"""
+
+        return self.isLineStreak(self.lineMask(row, col, runLength, 0, 1), value, streakLength)
+
+    def isVertStreak(self, row, col, runLength, value, streakLength):
+        """Do we have a vertical streak, i.e. n out of m of the same value starting at row,col"""
+
+        return self.isLineStreak(self.lineMask(row, col, runLength, 1, 0), value, streakLength)
+
+    def isDiagStreak(self, row, col, runLength, value, streakLength):
+        """Do we have a diagonal streak, i.e. n out of m of the same value starting at row,col"""
+
+        return self.isLineStreak(self.lineMask(row, col, runLength, 1, 1), value, streakLength)
+
+    def isReverseDiagStreak(self, row, col, runLength, value, streakLength):
+        """
+        Do we have a reverse diagonal streak, i.e. n out of m of the same value starting at row,col.
+        The row number provided should be the lowest in the possible run
+        """
+
+        return self.isLineStreak(self.lineMask(row, col, runLength, 1, -1), value, streakLength)
+
+    def hasRun(self, runLength, value):
+        """
+        Do we have a run of the same value anywhere on the board, in any direction.
+        Each direction is checked with a few shifts and masks of the whole bitboard.
+        """
+
+        bits = self.bits[self.PIECES.index(value)]
+        for shift in self.shifts:
+            # Keep only the cells that start a run, doubling the length checked each time
+            run = bits
+            length = 1
+            while length * 2 <= runLength:
+                run &= run >> (shift * length)
+                length *= 2
+            if length < runLength:
+                run &= run >> (shift * (runLength - length))
+            if run:
+                return True
+
+        return False
+
+    def lastMoveWins(self, runLength):
+        """
+        Did the last piece placed complete a run of runLength cells.
+        Only the lines through that cell are checked, so this assumes nobody had already won before it.
+        Returns False if there is no last move, e.g. after a piece has been removed.
+        """
+
+        if self.lastMove is None:
+            return False
+
+        row, col = self.lastMove
+        bit = self.cellBit(row, col)
+        bits = self.bits[0] if self.bits[0] & bit else self.bits[1]
+        for shift in self.shifts:
+            # Count the matching cells running away from the last move in both directions
+            length = 1
+            nextBit = bit << shift
+            while bits & nextBit:
+                length += 1
+                nextBit <<= shift
+            nextBit = bit >> shift
+            while bits & nextBit:
+                length += 1
+                nextBit >>= shift
+            if length >= runLength:
+                return True
+
+        return False
+
+    def winner(self, runLength):
+        """Get the value which has a run of runLength cells anywhere on the board, or None"""
+
+        for value in self.PIECES:
+            if self.hasRun(runLength, value):
+                return value
+
+        return None
+
+    def boardIsFull(self):
+        """Check if the board is full"""
+
+        return all(height == self.rows for height in self.stackHeight)
+
+    def stackIsFull(self, stack):
+        """Check if the given stack is full"""
+
+        return self.stackHeight[stack] == self.rows
+
+    def getFullStacks(self):
+        """Get a list of all stacks that are full"""
+
+        return [stack for stack in range(self.cols) if self.stackHeight[stack] == self.rows]
+
+    def getNonFullStacks(self):
+        """Get a list of all stacks that are not full"""
+
+        return [stack for stack in range(self.cols) if self.stackHeight[stack] < self.rows]
+
+    def getEmptyStacks(self):
+        """Get a list of all stacks that are empty"""
+
+        return [stack for stack in range(self.cols) if self.stackHeight[stack] == 0]
+
+    def orderStacks(self, stacks):
+        """Sort the given stacks so those nearest the middle come first, as they are part of the most runs"""
+
+        return sorted(stacks, key=lambda stack: abs(2 * stack - (self.cols - 1)))
+
+    def addToStack(self, stack, value):
+        """Add the piece 'value' to the given stack"""
+
+        row = self.stackHeight[stack]  # make sure counter is dropped at top of column
+        self.bits[self.PIECES.index(value)] |= 1 << (stack * self.stackSize + row)
+        self._zobristKey ^= zobristTable(self.rows, self.cols, value)[row][stack]
+        self.stackHeight[stack] += 1
+        self.updateLastMove(row, stack, True)
+
+    def removeFromStack(self, stack):
+        """Remove the top piece from the given stack, e.g. to undo a move.  Returns the piece removed"""
+
+        self.stackHeight[stack] -= 1
+        row = self.stackHeight[stack]
+        bit = 1 << (stack * self.stackSize + row)
+        player = 0 if self.bits[0] & bit else 1
+        self.bits[player] &= ~bit
+        value = self.PIECES[player]
+        self._zobristKey ^= zobristTable(self.rows, self.cols, value)[row][stack]
+        self.updateLastMove(row, stack, False)
+
+        return value
+
+    def symmetries(self):
+        """Get the transforms that keep the stacks upright, as for Stack2D"""
+
+        return (IDENTITY, MIRROR)
+
+    def getSymmetries(self):
+        """Get the transforms that leave the board exactly as it is, always including IDENTITY"""
+
+        grid = self.grid
+        return [transform for transform in self.symmetries() if np.array_equal(transformGrid(grid, transform), grid)]
+
+    def transformCell(self, row, col, transform):
+        """Get the (row, col) that the given cell moves to under the given transform"""
+
+        return transformCell(self.rows, self.cols, row, col, transform)
+
+    def transformStack(self, stack, transform):
+        """Get the stack that the given stack moves to under the given transform"""
+
+        return self.cols - 1 - stack if transform == MIRROR else stack
+
+    def transformed(self, transform):
+        """Return a copy of the board with the given transform applied"""
+
+        if transform == IDENTITY:
+            return self.copy()
+
+        stackHeight = [self.stackHeight[self.transformStack(stack, transform)] for stack in range(self.cols)]
+        board = BitStack2D(self.rows, self.cols, np.ascontiguousarray(transformGrid(self.grid, transform)), stackHeight)
+        board.flipped = self.flipped
+        return board
+
+    def canonicalForm(self):
+        """
+        Get the canonical form of the board, the same as Stack2D would give.
+        Returns a (board, transform) tuple, as for Board2D.canonicalForm().
+        """
+
+        transform = canonicalTransform(self.grid, self.symmetries())
+        return self.transformed(transform), transform
+
+    def canonicalKey(self):
+        """Get the Zobrist key of the canonical form of the board"""
+
+        return self.canonicalForm()[0].zobristKey
+
+    def copy(self):
+        board = BitStack2D(self.rows, self.cols)
+        board.flipped = self.flipped
+        board.bits = self.bits.copy()
+        board.stackHeight = self.stackHeight.copy()
+        board._zobristKey = self._zobristKey
+        board.lastMove = self.lastMove
+        board.earlierMoves = self.earlierMoves.copy()
+        return board
+
+
+class BoardBatch:
+    """
+    Many boards of the same size held in one (count, rows, cols) array of cell codes, so that each
+    check runs on every board in a single numpy call rather than one board at a time.
+    E.g. this can be used to analyse a whole layer of a search tree, or to play out many games at once.
+    Methods that take cells take cell values, as Board2D does, but methods that return the contents
+    of cells return codes (see CELL_CODES), since that is what an array of results can hold.
+    """
+
+    def __init__(self, rows, cols, count=0, grids=None):
+        """
+        Set up count empty boards, or a board for each grid in grids.
+        grids can be a list of the grids of other boards, or an array of them, holding either cell
+        values or codes.  An int8 array of codes is used as it is, not copied.
+        """
+
+        self.rows = rows
+        self.cols = cols
+        if grids is None:
+            self.grids = np.full((count, rows, cols), EMPTY, dtype=np.int8)
+        else:
+            self.grids = encodeGrid(np.asarray(grids)).reshape(-1, rows, cols)
+
+    def __len__(self):
+        return len(self.grids)
+
+    def board(self, index):
+        """Get a copy of the board with the given index, as a Board2D"""
+
+        return Board2D(self.rows, self.cols, self.grids[index].copy())
+
+    def setCell(self, row, col, value, boards=None):
+        """
+        Set the given cell on every board, or just the selected ones.
+        row and col are either numbers, to set the same cell on each board, or arrays with one
+        entry per board set.  value is a cell value, or an array of codes with one per board set.
+        boards selects the boards to set, as an array of indexes or a boolean mask.
+        """
+
+        code = CELL_CODES[value] if isinstance(value, str) else value
+        indexes = np.arange(len(self.grids))
+        if boards is not None:
+            indexes = indexes[boards]
+        self.grids[indexes, row, col] = code
+
+    def clearCell(self, row, col, boards=None):
+        """Empty the given cell on every board, or just the selected ones"""
+
+        self.setCell(row, col, '_', boards)
+
+    def getAvailableCells(self):
+        """
+        Get a (count, rows * cols) boolean array, True for each empty cell.  The cells are numbered
+        as Board2D.getAvailableCells() numbers them, so np.flatnonzero() of a row gives its result.
+        """
+
+        return self.grids.reshape(len(self.grids), -1) == EMPTY
+
+    def boardIsFull(self):
+        """Check which of the boards are full"""
+
+        return ~np.any(self.getAvailableCells(), axis=1)
+
+    def lastMoveWins(self, row, col, runLength):
+        """
+        Check which boards have a run of runLength cells through the given cell, of the piece in it.
+        row and col are numbers, or arrays with one entry per board, e.g. the last piece placed on each.
+        Only the lines through that cell are checked, so this assumes nobody had already won before it.
+        """
+
+        count = len(self.grids)
+        cellLines = cellLineTable(self.rows, self.cols, runLength)
+        cells = np.broadcast_to(np.asarray(row) * self.cols + np.asarray(col), (count,))
+        flatGrids = self.grids.ravel()
+        starts = np.arange(count) * (self.rows * self.cols)                                        # where each board starts in flatGrids
+        codes = flatGrids[starts + cells]
+
+        # Check the lines through the cells on every board at once, a position along them at a time.
+        # A small batch checks every line together, to make as few numpy calls as it can, but a big
+        # one goes a line at a time, to keep its arrays small enough to stay in the cache.  The
+        # padding lines read the wrong cells, but they are never runs
+        if count <= SMALL_BATCH:
+            isRun = cellLines[cells, :, 0] >= 0
+            for position in range(runLength):
+                isRun &= flatGrids[cellLines[cells, :, position] + starts[:, np.newaxis]] == codes[:, np.newaxis]
+            won = isRun.any(axis=1)
+        else:
+            won = np.zeros(count, dtype=bool)
+            for line in range(cellLines.shape[1]):
+                isRun = cellLines[cells, line, 0] >= 0
+                for position in range(runLength):
+                    isRun &= flatGrids[cellLines[cells, line, position] + starts] == codes
+                won |= isRun
+
+        return won & (codes != EMPTY)
+
+    def lineCells(self, runLength):
+        """Get a (count, lines, runLength) array of the codes along every line of runLength cells, on every board"""
+
+        return self.grids.reshape(len(self.grids), -1)[:, lineTable(self.rows, self.cols, runLength)]
+
+    def hasRun(self, runLength, value):
+        """Check which of the boards have a run of runLength cells of the same value anywhere"""
+
+        return np.any(np.all(self.lineCells(runLength) == CELL_CODES[value], axis=2), axis=1)
+
+    def winner(self, runLength):
+        """
+        Get the code of the value with a run of runLength cells on each board, or EMPTY if there is none.
+        If more than one value has a run, the one whose run comes first is returned, as Board2D.winner() does.
+        """
+
+        lineCells = self.lineCells(runLength)
+        firstCells = lineCells[:, :, 0]
+        isRun = np.all(lineCells == firstCells[:, :, np.newaxis], axis=2) & (firstCells != EMPTY)
+
+        return np.where(isRun.any(axis=1), firstCells[np.arange(len(firstCells)), np.argmax(isRun, axis=1)], EMPTY).astype(np.int8)
+
+    def copy(self):
+        """Return a copy of the batch"""
+
+        return BoardBatch(self.rows, self.cols, grids=self.grids.copy())
 
 
 # -------------------------------------------------------------------------------------------------
@@ -267,6 +1143,37 @@ if __name__ == "__main__":
     assert (not board.isDiagRun(0, 0, 3, 'X'))
     assert (board.isReverseDiagRun(0, 2, 3, 'X'))
 
+    # Check the grid is stored as codes, and moves can be found on boards of any size
+    board = Board2D(3, 3, np.array([['X', 'O', '_'], ['_', 'X', '_'], ['O', '_', '_']]))
+    assert (board.grid.dtype == np.int8)
+    assert (board.getCell(0, 1) == 'O' and board.getCell(0, 2) == '_')
+    assert (np.all(board.getStringGrid() == np.array([['X', 'O', '_'], ['_', 'X', '_'], ['O', '_', '_']])))
+    assert (board.getAvailableCells().tolist() == [2, 3, 5, 7, 8])
+    board = Board2D(4, 5)
+    board.setCell(0, 0, 'X')
+    board.setCell(3, 4, 'O')
+    assert (board.getAvailableCells().tolist() == list(range(1, 19)))
+    assert (not board.boardIsFull())
+
+    # Check for runs found across the whole board at once
+    board = Board2D(3, 3, np.array([['O', 'O', 'X'], ['O', 'X', '_'], ['X', '_', '_']]))
+    assert (board.findRuns(3, 'X').tolist() == [[2, 4, 6]])
+    assert (len(board.findRuns(3, 'O')) == 0)
+    assert (board.findRuns(2, 'O').tolist() == [[0, 1], [0, 3], [1, 3]])
+    assert (board.hasRun(3, 'X') and not board.hasRun(3, 'O'))
+    assert (board.winner(3) == 'X')
+    assert (Board2D(3, 3).winner(3) is None)
+    assert (len(lineTable(3, 3, 3)) == 8 and len(lineTable(6, 7, 4)) == 69)
+
+    # Check for a win through the last move only
+    board = Board2D(3, 3, np.array([['O', 'O', '_'], ['O', 'X', '_'], ['X', '_', '_']]))
+    assert (not board.lastMoveWins(3))
+    board.setCell(0, 2, 'X')
+    assert (board.lastMoveWins(3))
+    board.clearCell(0, 2)
+    board.setCell(2, 1, 'X')
+    assert (not board.lastMoveWins(3))
+
     # Check for horizontal streak
     board = Board2D(3, 3, np.array([['X', 'X', '_'], ['X', 'X', 'O'], ['X', '_', '_']]))
     assert (board.isHorizStreak(0, 0, 3, 'X', 2))
@@ -293,6 +1200,192 @@ if __name__ == "__main__":
     assert (not board.isReverseDiagStreak(0, 0, 3, 'X', 2))
     assert (board.isReverseDiagStreak(0, 2, 3, 'X', 2))
 
+    # Check the Zobrist key is updated incrementally and matches a full recalculation
+    board = Board2D(3, 3)
+    assert (board.zobristKey == 0)
+    board.setCell(1, 1, 'X')
+    board.setCell(0, 2, 'O')
+    assert (board.zobristKey == board.computeZobristKey())
+    assert (board.zobristKey == Board2D(3, 3, board.grid.copy()).zobristKey)
+    copied = board.copy()
+    copied.setCell(2, 0, 'X')
+    assert (copied.zobristKey != board.zobristKey)
+    copied.setCell(2, 0, '_')
+    assert (copied.zobristKey == board.zobristKey)
+
+    # Check that clearing a cell undoes setting it
+    board = Board2D(3, 3)
+    board.setCell(0, 1, 'X')
+    before = board.copy()
+    board.setCell(2, 2, 'O')
+    board.clearCell(2, 2)
+    assert (np.all(board.grid == before.grid))
+    assert (board.zobristKey == before.zobristKey)
+
+    # Check the same position reached by different move orders has the same key
+    stacks = Stack2D(6, 7)
+    otherStacks = Stack2D(6, 7)
+    for stack, value in [(3, 'X'), (3, 'O'), (4, 'X'), (2, 'O')]:
+        stacks.addToStack(stack, value)
+    for stack, value in [(4, 'X'), (2, 'O'), (3, 'X'), (3, 'O')]:
+        otherStacks.addToStack(stack, value)
+    assert (stacks.zobristKey == otherStacks.zobristKey)
+    assert (stacks.copy().zobristKey == stacks.zobristKey)
+
+    # Check the bitboard version agrees with Stack2D through some random Connect4 games
+    generator = random.Random(4)
+    for game in range(20):
+        stacks = Stack2D(6, 7)
+        bitStacks = BitStack2D(6, 7)
+        value = 'X'
+        while stacks.getNonFullStacks():
+            stack = generator.choice(stacks.getNonFullStacks())
+            wasRun = stacks.hasRun(4, value)
+            stacks.addToStack(stack, value)
+            bitStacks.addToStack(stack, value)
+            assert (stacks.lastMoveWins(4) == bitStacks.lastMoveWins(4))
+            assert (wasRun or stacks.lastMoveWins(4) == stacks.hasRun(4, value))
+            assert (stacks.copy().lastMoveWins(4) == stacks.lastMoveWins(4))
+            value = 'O' if value == 'X' else 'X'
+            assert (np.all(bitStacks.grid == stacks.grid))
+            assert (bitStacks.zobristKey == stacks.zobristKey)
+            assert (bitStacks.getNonFullStacks() == stacks.getNonFullStacks())
+            for player in ('X', 'O'):
+                anyRun = False
+                for row in range(6):
+                    for col in range(7):
+                        for check in ('isHorizRun', 'isVertRun', 'isDiagRun', 'isReverseDiagRun'):
+                            isRun = getattr(stacks, check)(row, col, 4, player)
+                            assert (getattr(bitStacks, check)(row, col, 4, player) == isRun)
+                            anyRun = anyRun or isRun
+                        for check in ('isHorizStreak', 'isVertStreak', 'isDiagStreak', 'isReverseDiagStreak'):
+                            assert (getattr(bitStacks, check)(row, col, 4, player, 2) == getattr(stacks, check)(row, col, 4, player, 2))
+                assert (bitStacks.hasRun(4, player) == anyRun)
+                assert (stacks.hasRun(4, player) == anyRun)
+            assert (bitStacks.winner(4) == stacks.winner(4) or (bitStacks.hasRun(4, 'X') and bitStacks.hasRun(4, 'O')))
+        assert (bitStacks.boardIsFull())
+        assert (BitStack2D(6, 7, stacks.grid.copy()).bits == bitStacks.bits)
+
+        # Take the pieces back out again, checking both boards stay in step
+        while stacks.getEmptyStacks() != list(range(7)):
+            stack = generator.choice([stack for stack in range(7) if stacks.stackHeight[stack] > 0])
+            assert (stacks.removeFromStack(stack) == bitStacks.removeFromStack(stack))
+            assert (np.all(bitStacks.grid == stacks.grid))
+            assert (bitStacks.stackHeight == stacks.stackHeight)
+            assert (bitStacks.zobristKey == stacks.zobristKey)
+        assert (stacks.zobristKey == 0 and bitStacks.bits == [0, 0])
+
+    # Check undoing moves brings back the last move before them, so wins can still be found from it
+    generator = random.Random(5)
+    for game in range(20):
+        board = Board2D(3, 3)
+        stacks = Stack2D(6, 7)
+        bitStacks = BitStack2D(6, 7)
+        cells = generator.sample(range(9), 9)
+        columns = [generator.choice(range(7)) for move in range(20)]
+        columns = [stack for index, stack in enumerate(columns) if columns[:index + 1].count(stack) <= 6]
+        lastMoves = [[], [], []]
+        for cell in cells:
+            lastMoves[0].append(board.lastMove)
+            board.setCell(cell // 3, cell % 3, generator.choice('XO'))
+        for stack in columns:
+            lastMoves[1].append(stacks.lastMove)
+            lastMoves[2].append(bitStacks.lastMove)
+            value = generator.choice('XO')
+            stacks.addToStack(stack, value)
+            bitStacks.addToStack(stack, value)
+        for cell in reversed(cells):
+            board.clearCell(cell // 3, cell % 3)
+            assert (board.lastMove == lastMoves[0].pop())
+        for stack in reversed(columns):
+            stacks.removeFromStack(stack)
+            bitStacks.removeFromStack(stack)
+            assert (stacks.lastMove == lastMoves[1].pop())
+            assert (bitStacks.lastMove == lastMoves[2].pop())
+
+    # Check symmetric boards share a canonical form, and that cells map back to where they came from
+    generator = random.Random(4)
+    for game in range(20):
+        board = Board2D(3, 3)
+        for cell in generator.sample(range(9), generator.randrange(9)):
+            board.setCell(cell // 3, cell % 3, generator.choice('XO'))
+        canonical, transform = board.canonicalForm()
+        assert (np.array_equal(canonical.grid, transformGrid(board.grid, transform)))
+        for symmetry in range(8):
+            image = board.transformed(symmetry)
+            assert (image.canonicalKey() == board.canonicalKey())
+            for row in range(3):
+                for col in range(3):
+                    newRow, newCol = image.transformCell(row, col, symmetry)
+                    assert (image.getCell(newRow, newCol) == board.getCell(row, col))
+                    assert (transformCell(3, 3, newRow, newCol, inverseTransform(symmetry)) == (row, col))
+    assert (len(Board2D(3, 3).getSymmetries()) == 8)
+    assert (Board2D(3, 4).symmetries() == (0, 2, 4, 6))
+    board = Board2D(3, 3)
+    board.setCell(0, 0, 'X')
+    assert (sorted(board.getSymmetries()) == [0, 7])                                                   # only the reflection in the main diagonal
+
+    # Check each board has its own rank
+    assert (Board2D(3, 3).rank() == 0)
+    assert (Board2D(3, 3, [['X', 'O', '_'], ['_', '_', '_'], ['_', '_', 'O']]).rank() == 1 + 2 * 3 + 2 * 3 ** 8)
+    assert (Board2D(3, 3, [['O'] * 3] * 3).rank() == 3 ** 9 - 1)
+
+    # Stacks only have a mirror image, and the bitboard version agrees with Stack2D
+    for game in range(20):
+        stacks = Stack2D(6, 7)
+        bitStacks = BitStack2D(6, 7)
+        for move in range(generator.randrange(20)):
+            stack = generator.choice(stacks.getNonFullStacks())
+            player = generator.choice('XO')
+            stacks.addToStack(stack, player)
+            bitStacks.addToStack(stack, player)
+        mirrored = stacks.transformed(MIRROR)
+        assert (mirrored.canonicalKey() == stacks.canonicalKey() == bitStacks.canonicalKey())
+        assert (mirrored.stackHeight == stacks.stackHeight[::-1])
+        assert (bitStacks.transformed(MIRROR).zobristKey == mirrored.zobristKey)
+        assert (stacks.getSymmetries() == bitStacks.getSymmetries())
+    assert (BitStack2D(6, 7).getSymmetries() == [IDENTITY, MIRROR])
+
+    # Check a batch of boards gets the same answers as checking each board on its own
+    for rows, cols, runLength in ((3, 3, 3), (6, 7, 4)):
+        boards = []
+        for game in range(50):
+            board = Board2D(rows, cols)
+            for cell in generator.sample(range(rows * cols), generator.randrange(rows * cols + 1)):
+                board.setCell(cell // cols, cell % cols, generator.choice('XO'))
+            boards.append(board)
+        batch = BoardBatch(rows, cols, grids=[board.grid for board in boards])
+        available = batch.getAvailableCells()
+        isFull = batch.boardIsFull()
+        winners = batch.winner(runLength)
+        for player in ('X', 'O'):
+            assert (batch.hasRun(runLength, player).tolist() == [board.hasRun(runLength, player) for board in boards])
+        lastMoves = [generator.randrange(rows * cols) for board in boards]
+        lastMoveWins = batch.lastMoveWins(np.array(lastMoves) // cols, np.array(lastMoves) % cols, runLength)
+        copies = SMALL_BATCH // len(boards) + 1                                                    # enough to check big batches the other way
+        bigBatch = BoardBatch(rows, cols, grids=np.tile(batch.grids, (copies, 1, 1)))
+        assert (np.array_equal(bigBatch.lastMoveWins(np.tile(lastMoves, copies) // cols, np.tile(lastMoves, copies) % cols, runLength), np.tile(lastMoveWins, copies)))
+        for index, board in enumerate(boards):
+            board.lastMove = divmod(lastMoves[index], cols) if board.grid.ravel()[lastMoves[index]] != EMPTY else None
+            assert (lastMoveWins[index] == board.lastMoveWins(runLength))
+            assert (np.flatnonzero(available[index]).tolist() == board.getAvailableCells().tolist())
+            assert (isFull[index] == board.boardIsFull())
+            assert (CELL_VALUES[winners[index]] == (board.winner(runLength) or '_'))
+            assert (np.array_equal(batch.board(index).grid, board.grid))
+    batch = BoardBatch(3, 3, 4)
+    batch.setCell(1, 1, 'X')
+    batch.setCell(np.array([0, 2]), np.array([0, 2]), 'O', np.array([True, False, True, False]))
+    batch.setCell(0, np.arange(4) % 3, np.array([1, 2, 1, 2], dtype=np.int8))
+    assert (batch.board(0).getStringGrid().tolist() == [['X', '_', '_'], ['_', 'X', '_'], ['_', '_', '_']])
+    assert (batch.board(2).getStringGrid().tolist() == [['_', '_', 'X'], ['_', 'X', '_'], ['_', '_', 'O']])
+    copied = batch.copy()
+    copied.clearCell(1, 1)
+    assert (batch.getAvailableCells().sum() == 4 * 9 - 9 and copied.getAvailableCells().sum() == 4 * 9 - 5)
+
+    # Check stacks are ordered from the middle out
+    assert (Stack2D(6, 7).orderStacks(range(7)) == [3, 2, 4, 1, 5, 0, 6])
+    assert (BitStack2D(6, 7).orderStacks([0, 1, 5, 6]) == [1, 5, 0, 6])
+
     # Test out some Connect4 scenarios
     _ROWS = 6
     _COLS = 7
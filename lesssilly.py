@@ -75,6 +75,11 @@ class LessSilly:
 
         board[move] = 'X' if computerTurn else 'O'
 
+    def undoMove(self, move):
+        """Undo the given move, which must be the last move applied"""
+
+        self.state[move] = '_'
+
     def getScore(self):
         board = self.state
         # Scenarios where computer wins
@@ -114,6 +119,11 @@ class LessSilly:
 
         return LessSilly(self.state.copy())
 
+    def getKey(self):
+        """Return a hashable value that identifies the current game state"""
+
+        return ''.join(self.state)
+
     def prettyPath(self, path):
         """
         Show the evaluation path neatly formatted.
@@ -141,5 +151,6 @@ class LessSilly:
 # Main program
 # -------------------------------------------------------------------------------------------------
 
-game = LessSilly()
-play(game, ALG_MINIMAX)
+if __name__ == "__main__":
+    game = LessSilly()
+    play(game, ALG_MINIMAX)
@@ -0,0 +1,403 @@
+'''
+mcts.py
+
+Implements Monte Carlo tree search (MCTS), choosing which moves to explore with the UCT formula, for
+games too big for minimax to search well, such as Connect 4 on bigger boards.
+
+Rather than scoring positions at a fixed depth, each iteration walks down the tree from the root,
+picking the move at each node that best balances how well it has done so far against how little it
+has been tried.  Where the walk leaves the tree, the moves there are added to it and random games
+are played from the new position to the end.  Their results are added to every node on the way down,
+so the tree grows towards the most promising moves.  The search can be stopped at any time, after a
+number of iterations or seconds, and plays the move tried most often.
+
+The tree is kept in numpy arrays with one entry per node, rather than one Python object per node.
+The children of a node are added together, so they sit next to each other in the arrays and a node
+only needs the index of its first child and the number of children.  Game states aren't kept at all:
+each iteration replays the moves from the root.
+
+Iterations are run in batches.  Each leaf picked in a batch is counted as visited straight away, a
+"virtual loss", so the next pick tends to go elsewhere, then random games are played from all the
+leaves of the batch at once.  If the game provides getRunLength() (see minimax.py) they are played
+in lockstep with numpy (see playout.py), otherwise one at a time through the game's own methods.
+
+Keep one MCTS for the whole game: asked for a move in a position it has already explored, such as
+the player's reply to its last move, it keeps that part of the tree and carries on from there.
+Recognising the position needs the game to provide getKey().
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import random
+import time
+import numpy as np
+
+from gamestate import BoardBatch, EMPTY
+from playout import playBatch, X, O
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+EXPLORATION = 1.4           # weight UCT gives to trying moves that have been tried least, about sqrt(2)
+LEAVES_PER_BATCH = 32       # leaves picked before the random games from them are played together
+ROLLOUTS_PER_LEAF = 4       # random games played from each leaf
+DEFAULT_ITERATIONS = 4096   # iterations a search runs if it is given no budget
+INITIAL_CAPACITY = 4096     # nodes the arrays have room for at first, they double whenever they fill up
+REUSE_DEPTH = 2             # how many moves below the old root a search looks for its new position
+
+OUTCOME_UNKNOWN = -1.0      # outcome of a node whose position hasn't been looked at yet
+OUTCOME_OPEN = -2.0         # outcome of a node where the game isn't over
+
+# The computer's reward for each result of a game, from its score
+WIN = 1.0
+DRAW = 0.5
+LOSS = 0.0
+
+
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
+
+class MCTS:
+    """
+    A Monte Carlo search tree, rooted at the position the computer was last asked to move from.
+    Each node is a position, reached by a move from its parent's position, and holds:
+        - moveNumber, the number of that move in the list getPossibleMoves() returns for the parent
+        - byComputer, whether it was the computer's move
+        - firstChild and childCount, the nodes for the moves from the position, once they are added
+        - visits, the number of random games played through the node
+        - wins, the total reward of those games for the side that made the move: 1 for a win, 0.5
+          for a draw
+        - outcome, the computer's reward if the game is over in the position (see OUTCOME_OPEN)
+    """
+
+    def __init__(self, exploration=EXPLORATION, leavesPerBatch=LEAVES_PER_BATCH, rolloutsPerLeaf=ROLLOUTS_PER_LEAF, seed=None):
+        """Set up an empty tree.  seed seeds the random numbers, so searches can be repeated"""
+
+        self.exploration = exploration
+        self.leavesPerBatch = leavesPerBatch
+        self.rolloutsPerLeaf = rolloutsPerLeaf
+        self.generator = np.random.default_rng(seed)
+        self.random = random.Random(seed)
+        self.stats = {}
+        self.clear()
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        """Throw the whole tree away"""
+
+        self.rootGame = None
+        self.size = 0
+        self.moveNumber = np.zeros(INITIAL_CAPACITY, dtype=np.int16)
+        self.byComputer = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self.firstChild = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.childCount = np.zeros(INITIAL_CAPACITY, dtype=np.int16)
+        self.visits = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.wins = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.outcome = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+
+    def addNodes(self, count, byComputer):
+        """Add count new nodes for moves by the computer, or not, to the end of the arrays.  Returns the index of the first"""
+
+        # Double the arrays whenever they fill up
+        if self.size + count > len(self.visits):
+            capacity = max(2 * len(self.visits), self.size + count)
+            for name in ("moveNumber", "byComputer", "firstChild", "childCount", "visits", "wins", "outcome"):
+                array = getattr(self, name)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                setattr(self, name, grown)
+
+        first = self.size
+        nodes = slice(first, first + count)
+        self.moveNumber[nodes] = np.arange(count)
+        self.byComputer[nodes] = byComputer
+        self.firstChild[nodes] = -1
+        self.childCount[nodes] = 0
+        self.visits[nodes] = 0
+        self.wins[nodes] = 0.0
+        self.outcome[nodes] = OUTCOME_UNKNOWN
+        self.size += count
+
+        return first
+
+    def expand(self, node, game):
+        """Add the children of the given node, whose position is game"""
+
+        count = len(game.getPossibleMoves())
+        self.firstChild[node] = self.addNodes(count, not self.byComputer[node])
+        self.childCount[node] = count
+
+    def checkOutcome(self, node, game):
+        """Look at the position of the given node, game, to see if the game is over there"""
+
+        score, gameOver = game.getScore()
+        if not gameOver:
+            self.outcome[node] = OUTCOME_OPEN
+        elif score > 0:
+            self.outcome[node] = WIN
+        elif score < 0:
+            self.outcome[node] = LOSS
+        else:
+            self.outcome[node] = DRAW
+
+    def selectChild(self, node):
+        """Pick the child of the given node to explore: an untried move at random, otherwise the best by UCT"""
+
+        first = self.firstChild[node]
+        children = slice(first, first + self.childCount[node])
+        visits = self.visits[children]
+        untried = np.flatnonzero(visits == 0)
+        if len(untried) > 0:
+            return first + untried[self.generator.integers(len(untried))]
+
+        uct = self.wins[children] / visits + self.exploration * np.sqrt(np.log(self.visits[node]) / visits)
+        return first + int(np.argmax(uct))
+
+    def selectLeaf(self):
+        """
+        Walk down the tree from the root, adding the children of the last node already explored.
+        Returns a (path, game) tuple: the indexes of the nodes on the way down, and the position of the last.
+        """
+
+        node = 0
+        path = [0]
+        game = self.rootGame.copy()
+        while True:
+            if self.outcome[node] == OUTCOME_UNKNOWN:
+                self.checkOutcome(node, game)
+            if self.outcome[node] != OUTCOME_OPEN or (self.visits[node] == 0 and node != 0):
+                return path, game
+
+            if self.childCount[node] == 0:
+                self.expand(node, game)
+            child = self.selectChild(node)
+            game.applyMove(game.getPossibleMoves()[self.moveNumber[child]], bool(self.byComputer[child]))
+            path.append(child)
+            node = child
+
+    def rollout(self, games, computerTurns):
+        """
+        Play rolloutsPerLeaf random games from each of the given games, with the computer to move in
+        those where computerTurns is True.  Returns the computer's total reward from each.
+        """
+
+        rollouts = self.rolloutsPerLeaf
+        if hasattr(games[0], "getRunLength"):
+            board = games[0].state
+            grids = np.repeat(np.array([game.state.grid for game in games]), rollouts, axis=0)
+            codes = np.repeat(np.where(computerTurns, X, O), rollouts)
+            winners, lengths = playBatch(BoardBatch(board.rows, board.cols, grids=grids), codes,
+                                         games[0].getRunLength(), hasattr(board, "stackHeight"), self.generator)
+            rewards = np.where(winners == X, WIN, np.where(winners == EMPTY, DRAW, LOSS))
+            return rewards.reshape(len(games), rollouts).sum(axis=1)
+
+        # Without a board to play on in batches, play each game through the game's own methods
+        totals = np.zeros(len(games))
+        for index, game in enumerate(games):
+            for rollout in range(rollouts):
+                newGame = game.copy()
+                computerTurn = computerTurns[index]
+                score, gameOver = newGame.getScore()
+                while not gameOver:
+                    newGame.applyMove(self.random.choice(newGame.getPossibleMoves()), computerTurn)
+                    computerTurn = not computerTurn
+                    score, gameOver = newGame.getScore()
+                totals[index] += WIN if score > 0 else LOSS if score < 0 else DRAW
+
+        return totals
+
+    def runBatch(self, count):
+        """Run count iterations, playing the random games for all of them together.  Returns the deepest leaf reached"""
+
+        rollouts = self.rolloutsPerLeaf
+        paths = []
+        games = []
+        for iteration in range(count):
+            path, game = self.selectLeaf()
+            self.visits[path] += rollouts                                                           # the virtual loss, until the results are in
+            paths.append(np.array(path))
+            games.append(game)
+
+        # Games over at the leaf score their outcome, the rest are played out
+        leaves = np.array([path[-1] for path in paths])
+        rewards = self.outcome[leaves] * rollouts
+        unfinished = np.flatnonzero(self.outcome[leaves] == OUTCOME_OPEN)
+        if len(unfinished) > 0:
+            rewards[unfinished] = self.rollout([games[index] for index in unfinished], ~self.byComputer[leaves[unfinished]])
+
+        # Each node gets the reward of the side that moved into it
+        for path, reward in zip(paths, rewards):
+            self.wins[path] += np.where(self.byComputer[path], reward, rollouts - reward)
+
+        return max(len(path) for path in paths) - 1
+
+    def findPosition(self, game):
+        """
+        Look for the given position, with the computer to move, within REUSE_DEPTH moves of the root.
+        Returns its node, or None.
+        """
+
+        key = game.getKey()
+        frontier = [(0, self.rootGame)]
+        for depth in range(REUSE_DEPTH + 1):
+            nextFrontier = []
+            for node, nodeGame in frontier:
+                if depth % 2 == 0 and nodeGame.getKey() == key:
+                    return node
+                first = self.firstChild[node]
+                options = nodeGame.getPossibleMoves()
+                for child in range(first, first + self.childCount[node]):
+                    newGame = nodeGame.copy()
+                    newGame.applyMove(options[self.moveNumber[child]], bool(self.byComputer[child]))
+                    nextFrontier.append((child, newGame))
+            frontier = nextFrontier
+
+        return None
+
+    def reroot(self, node):
+        """Make the given node the root, keeping only the nodes below it and packing them into the start of the arrays"""
+
+        # List the nodes below in breadth first order, so each node's children stay together
+        order = [node]
+        index = 0
+        while index < len(order):
+            parent = order[index]
+            if self.childCount[parent] > 0:
+                first = self.firstChild[parent]
+                order.extend(range(first, first + self.childCount[parent]))
+            index += 1
+        order = np.array(order)
+
+        newIndex = np.full(self.size, -1, dtype=np.int32)
+        newIndex[order] = np.arange(len(order))
+        firstChild = self.firstChild[order]
+        self.firstChild[:len(order)] = np.where(firstChild >= 0, newIndex[firstChild], -1)
+        for name in ("moveNumber", "byComputer", "childCount", "visits", "wins", "outcome"):
+            array = getattr(self, name)
+            array[:len(order)] = array[order]
+        self.size = len(order)
+
+    def moveRoot(self, game):
+        """Move the root to the given position, keeping what is known about it if it is in the tree.  Returns the number of nodes kept"""
+
+        if self.rootGame is not None and hasattr(game, "getKey"):
+            node = self.findPosition(game)
+            if node is not None:
+                self.reroot(node)
+                self.rootGame = game.copy()
+                return self.size
+
+        self.clear()
+        self.rootGame = game.copy()
+        self.addNodes(1, False)
+
+        return 0
+
+    def search(self, game, timeLimit=None, iterations=None):
+        """
+        Search for the computer's best move in the given position, for timeLimit seconds or the given
+        number of iterations, whichever runs out first, or DEFAULT_ITERATIONS if neither is given.
+        At least one batch of iterations is always run, so iterations must be at least 1.
+        Returns the move tried most often from the root.
+        """
+
+        if iterations is not None and iterations < 1:
+            raise ValueError("MCTS needs at least 1 iteration, not {}".format(iterations))
+
+        start = time.perf_counter()
+        if timeLimit is None and iterations is None:
+            iterations = DEFAULT_ITERATIONS
+        deadline = None if timeLimit is None else start + timeLimit
+        reusedNodes = self.moveRoot(game)
+
+        done = 0
+        maxDepth = 0
+        while True:
+            count = self.leavesPerBatch if iterations is None else min(self.leavesPerBatch, iterations - done)
+            maxDepth = max(maxDepth, self.runBatch(count))
+            done += count
+            if (iterations is not None and done >= iterations) or (deadline is not None and time.perf_counter() >= deadline):
+                break
+
+        # Play the move tried most often, which is safer than the one with the best average
+        first = self.firstChild[0]
+        best = first + int(np.argmax(self.visits[first:first + self.childCount[0]]))
+        move = self.rootGame.getPossibleMoves()[self.moveNumber[best]]
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "iterations": done,
+            "rollouts": done * self.rolloutsPerLeaf,
+            "seconds": elapsed,
+            "iterationsPerSecond": done / elapsed if elapsed > 0 else 0.0,
+            "rolloutsPerSecond": done * self.rolloutsPerLeaf / elapsed if elapsed > 0 else 0.0,
+            "nodes": self.size,
+            "reusedNodes": reusedNodes,
+            "maxDepth": maxDepth,
+            "rootVisits": int(self.visits[0]),
+            "bestVisits": int(self.visits[best]),
+            "bestValue": float(self.wins[best] / self.visits[best]),
+        }
+
+        return move
+
+    def getStats(self):
+        """Return the statistics for the last search as a dictionary"""
+
+        return self.stats
+
+
+# -------------------------------------------------------------------------------------------------
+# Code to test the MCTS class
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    from oxo import Oxo
+    from connect4 import Connect4
+
+    # Check an immediate win is taken, rather than blocking the player's threat
+    for seed in range(5):
+        game = Oxo()
+        for cell, computerTurn in ((0, True), (3, False), (1, True), (4, False)):
+            game.applyMove(cell, computerTurn)
+        assert (MCTS(seed=seed).search(game, iterations=256) == 2)
+
+    # And in Connect 4, where the win is the fourth piece in the bottom row
+    for seed in range(5):
+        game = Connect4()
+        for stack in range(3):
+            game.applyMove(stack, True)
+            game.applyMove(stack, False)
+        assert (MCTS(seed=seed).search(game, iterations=512) == 3)
+
+    # Check the player's threat is blocked when there is no win to take
+    for seed in range(5):
+        game = Oxo()
+        for cell, computerTurn in ((0, True), (4, False), (8, True), (2, False)):
+            game.applyMove(cell, computerTurn)
+        assert (MCTS(seed=seed).search(game, iterations=1024) == 6)
+
+    # Check a search with no iterations is refused, rather than failing part way through
+    for iterations in (0, -1):
+        try:
+            MCTS(seed=1).search(Oxo(), iterations=iterations)
+            assert (False)
+        except ValueError:
+            pass
+    assert (MCTS(seed=1).search(Oxo(), iterations=1) in Oxo().getPossibleMoves())
+
+    # Check the tree below the player's reply is kept for the next search
+    game = Connect4()
+    tree = MCTS(seed=1)
+    move = tree.search(game, iterations=1024)
+    game.applyMove(move, True)
+    game.applyMove(3, False)
+    tree.search(game, iterations=256)
+    stats = tree.getStats()
+    assert (stats["reusedNodes"] > 0 and stats["rootVisits"] >= stats["iterations"])
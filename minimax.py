@@ -32,18 +32,74 @@
 #
 #     def copy(self):
 #         """Return a copy of this game state"""
+#
+#     def getKey(self):
+#         """
+#         Optional.  Return a hashable value that identifies the current game state.
+#         If provided, searches use a transposition table (see transposition.py).
+#         """
+#
+#     def undoMove(self, move):
+#         """
+#         Optional.  Undo the given move, which must be the last move applied.
+#         If provided, searches apply and undo moves in place instead of copying the game at every node.
+#         """
+#
+#     def orderMoves(self, moves):
+#         """
+#         Optional.  Return the given moves, most promising first.
+#         If provided, alpha-beta searches start from this order (see moveordering.py).
+#         """
+#
+#     def getSymmetries(self):
+#         """
+#         Optional.  Return the transforms that leave the current game state unchanged (see gamestate.py).
+#         If provided, along with transformMove(), only one of each set of equivalent root moves is searched.
+#         """
+#
+#     def transformMove(self, move, transform):
+#         """Optional.  Return the move that the given transform maps the given move onto"""
+#
+#     def getRunLength(self):
+#         """
+#         Optional.  Return the length of run that wins, for a game won by making runs on a Board2D,
+#         Stack2D or BitStack2D in self.state.  If provided, Monte Carlo tree search plays its random
+#         games in batches with numpy (see playout.py) rather than one at a time through this class.
+#         """
 
 # The algorithm can be run like this:
 
 # game = Game()
 # play(game, ALG_MINIMAX)
 
+# or, to search the player's likely replies while the player thinks:
+
+# play(game, ALG_ALPHABETA, ponder=True)
+
+# The searches can be watched as they run, e.g. to trace or count the nodes, by passing them hooks
+# (see searchhooks.py).  minimaxdebug.py uses these to show the evaluation path.  To get the
+# statistics for a search (see searchstats.py) back with the move:
+
+# move, stats = computerMoveMinimax(game, ALG_ALPHABETA, stats=True)
+# print(stats.toJSON())
+
 # -------------------------------------------------------------------------------------------------
 # Imports
 # -------------------------------------------------------------------------------------------------
 
+import multiprocessing
+import os
+import queue
 import random
+import threading
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWERBOUND, UPPERBOUND, RESOLVED_DEPTH
+from moveordering import MoveOrdering
+from mcts import MCTS
+from searchstats import SearchStats
 
 # -------------------------------------------------------------------------------------------------
 # Constants
@@ -52,64 +108,238 @@ import numpy as np
 ALG_RANDOM  = 0      # use a random play algorithm
 ALG_MINIMAX = 1      # use a minimax algorithm
 ALG_ALPHABETA = 2    # use a minimax algorithm with alpha-beta pruning
+ALG_NEGAMAX = 3      # use a negamax algorithm with principal variation search
+ALG_LAZYSMP = 4      # use alpha-beta in several processes sharing one transposition table
+ALG_YBW = 5          # use alpha-beta, sharing out the moves after the first at each node between processes
+ALG_MCTS = 6         # use Monte Carlo tree search
+
+INFINITY = 200              # bigger than any score a game can return
+ASPIRATION_WINDOW = 25      # how far either side of its guess an aspiration search looks at first
+
+SPLIT_DEPTH = 3             # the least remaining depth at which a YBWPool shares out the moves at a node
+SPLIT_SLOTS = 64            # split points each YBWPool process can have open at once, at most one per ply
+CANCEL_CHECK_NODES = 256    # how often, in nodes, a YBWPool search checks whether its work is still wanted
+
+PONDER_ALGORITHMS = (ALG_MINIMAX, ALG_ALPHABETA, ALG_NEGAMAX)  # the algorithms that can ponder
+PONDER_REPLIES = 8          # most of the player's replies pondered, the likeliest first
+
+
+# -------------------------------------------------------------------------------------------------
+# Search limits
+# -------------------------------------------------------------------------------------------------
+
+class SearchAborted(Exception):
+    """Raised inside a search when it runs out of its time or node budget"""
+
+
+class SearchLimits:
+    """
+    The limits on a search, and a record of how much of them has been used.
+    maxDepth is the depth to search to, in place of game.maxDepth.
+    The search is aborted with SearchAborted once it has visited nodeLimit nodes or run for
+    timeLimit seconds, whichever comes first.  Either limit can be None.
+    """
+
+    def __init__(self, maxDepth, timeLimit=None, nodeLimit=None):
+        """Set the limits up, starting the clock for timeLimit now"""
+
+        self.maxDepth = maxDepth
+        self.nodeLimit = nodeLimit
+        self.deadline = None if timeLimit is None else time.perf_counter() + timeLimit
+        self.nodes = 0
+        self.depthCutoffs = 0                                                                       # nodes scored only because they reached maxDepth
+
+    def visitNode(self):
+        """Count a node, aborting the search if the budget has run out"""
+
+        self.nodes += 1
+        if self.nodeLimit is not None and self.nodes > self.nodeLimit:
+            raise SearchAborted("Node limit of {} reached".format(self.nodeLimit))
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchAborted("Time limit reached")
+
+
+# -------------------------------------------------------------------------------------------------
+# Algorithms
+# -------------------------------------------------------------------------------------------------
 
+def minimax(game, maxTurn, depth, table=None, limits=None, hooks=None):
+    """
+    Apply the miminax algorithm recursively.
+    limits is an optional SearchLimits, giving the depth to search to and the budget for the search.
+    hooks is an optional SearchHooks (see searchhooks.py), told about each node as it is searched.
+    """
 
-def minimax(game, maxTurn, depth):
-    """Apply the miminax algorithm recursively"""
+    if limits is None:
+        maxDepth = game.maxDepth
+    else:
+        limits.visitNode()
+        maxDepth = limits.maxDepth
+    if hooks is not None:
+        hooks.onNode(game, maxTurn, depth)
 
     # Get the score for the current game
     score, gameOver = game.getScore()
 
     # If we have reached the end of the game or reached the max depth then return the score
-    if gameOver or depth==game.maxDepth:                     
+    if gameOver or depth==maxDepth:                     
+        if not gameOver and limits is not None:
+            limits.depthCutoffs += 1
+        if hooks is not None:
+            hooks.onLeaf(game, maxTurn, depth, score, gameOver)
         return score
 
+    # If we have already searched this state deep enough then reuse the score
+    if table is not None:
+        key = (game.getKey(), maxTurn)
+        entry = table.lookup(key, maxDepth - depth)
+        if entry is not None:
+            score, flag, entryDepth = entry
+            if entryDepth != RESOLVED_DEPTH and limits is not None:
+                limits.depthCutoffs += 1                                                            # the stored search was cut off by depth too
+            return score                                                                            # minimax only stores exact scores
+        if limits is not None:
+            cutoffsBefore = limits.depthCutoffs
+
     # Search the tree, generating the values for all the moves
     bestScore = None
+    inPlace = hasattr(game, "undoMove")
     for option in game.getPossibleMoves():
         # Try a move, all the way down the tree
-        newGame = game.copy()
+        if inPlace:
+            newGame = game
+        else:
+            newGame = game.copy()
         newGame.applyMove(option, maxTurn)
-        score = minimax(newGame, not maxTurn, depth+1)
+        score = minimax(newGame, not maxTurn, depth+1, table, limits, hooks)
+        if inPlace:
+            game.undoMove(option)
 
         # Check if this move beats our best move
         if maxTurn:
             if bestScore is None or score > bestScore:                                              # trying to maximise the score
                 bestScore = score
+                if hooks is not None:
+                    hooks.onBestUpdate(game, maxTurn, depth, option, score)
         else: # minTurn
             if bestScore is None or score < bestScore:                                              # trying to minimise the score
                 bestScore = score
+                if hooks is not None:
+                    hooks.onBestUpdate(game, maxTurn, depth, option, score)
+
+    # Remember the result, which is good for any depth if nothing below was cut off by depth
+    if table is not None:
+        if limits is not None and limits.depthCutoffs == cutoffsBefore:
+            table.store(key, bestScore, RESOLVED_DEPTH, EXACT)
+        else:
+            table.store(key, bestScore, maxDepth - depth, EXACT)
 
     return bestScore
 
 
-def alphabeta(game, maxTurn, alpha, beta, depth):
-    """Apply the miminax with alpha-beta pruning algorithm recursively"""
+def alphabeta(game, maxTurn, alpha, beta, depth, table=None, limits=None, ordering=None, pool=None, hooks=None):
+    """
+    Apply the miminax with alpha-beta pruning algorithm recursively.
+    limits is an optional SearchLimits, giving the depth to search to and the budget for the search.
+    ordering is an optional MoveOrdering, used to search the most promising moves first.
+    pool is an optional YBWPool.  If given, once the first move at a node at least SPLIT_DEPTH from
+    the bottom of the tree has been searched, the rest are shared out between the pool's processes.
+    hooks is an optional SearchHooks, as for minimax().  The moves a pool shares out aren't hooked.
+    """
+
+    if limits is None:
+        maxDepth = game.maxDepth
+    else:
+        limits.visitNode()
+        maxDepth = limits.maxDepth
+    if hooks is not None:
+        hooks.onNode(game, maxTurn, depth)
 
     # Get the score for the current game
-    scope, gameOver = game.getScore()
+    score, gameOver = game.getScore()
 
     # If we have reached the end of the game or reached the max depth then return the score
-    if gameOver or depth==game.maxDepth:                     
+    if gameOver or depth==maxDepth:                     
+        if not gameOver and limits is not None:
+            limits.depthCutoffs += 1
+        if hooks is not None:
+            hooks.onLeaf(game, maxTurn, depth, score, gameOver)
         return score
 
+    # If we have already searched this state deep enough then reuse the score, or narrow the window
+    originalAlpha = alpha
+    originalBeta = beta
+    if table is not None:
+        key = (game.getKey(), maxTurn)
+        entry = table.lookup(key, maxDepth - depth)
+        if entry is not None:
+            score, flag, entryDepth = entry
+            if flag == EXACT:
+                alpha = beta = score
+            elif flag == LOWERBOUND and score > alpha:
+                alpha = score
+            elif flag == UPPERBOUND and score < beta:
+                beta = score
+            if alpha >= beta:
+                if entryDepth != RESOLVED_DEPTH and limits is not None:
+                    limits.depthCutoffs += 1                                                        # the stored search was cut off by depth too
+                return score
+        if limits is not None:
+            cutoffsBefore = limits.depthCutoffs
+
+    # Put the moves most likely to cause a cutoff first
+    options = game.getPossibleMoves()
+    if ordering is not None:
+        pvMove = table.getMove(key) if table is not None else None
+        options = ordering.orderMoves(game, options, maxTurn, depth, pvMove)
+
     # Search the tree, generating the values for all the moves
-    for option in game.getPossibleMoves():
+    bestMove = None
+    inPlace = hasattr(game, "undoMove")
+    for moveNumber, option in enumerate(options):
+        # Once the eldest brother has been searched, the younger ones can be searched in parallel
+        if moveNumber == 1 and pool is not None and maxDepth - depth >= SPLIT_DEPTH:
+            alpha, beta, splitIndex, cutoff = pool.split(game, options[1:], maxTurn, alpha, beta, depth, table, limits, ordering)
+            if splitIndex is not None:
+                bestMove = options[1 + splitIndex]
+                if cutoff and ordering is not None:
+                    ordering.recordCutoff(bestMove, maxTurn, depth, maxDepth - depth, 1 + splitIndex)
+            break
+
         # Try a move, all the way down the tree
-        newGame = game.copy()
+        if inPlace:
+            newGame = game
+        else:
+            newGame = game.copy()
         newGame.applyMove(option, maxTurn)
-        score = alphabeta(newGame, not maxTurn, alpha, beta, depth+1)
+        score = alphabeta(newGame, not maxTurn, alpha, beta, depth+1, table, limits, ordering, pool, hooks)
+        if inPlace:
+            game.undoMove(option)
 
         # Check if this move beats our best move
         if maxTurn:
             if score > alpha:                                                                       # trying to maximise the score
                 alpha = score                                                                       # alpha is the max score so far
+                bestMove = option
+                if hooks is not None:
+                    hooks.onBestUpdate(game, maxTurn, depth, option, score)
             if alpha >= beta:
+                if ordering is not None:
+                    ordering.recordCutoff(option, maxTurn, depth, maxDepth - depth, moveNumber)
+                if hooks is not None:
+                    hooks.onCutoff(game, maxTurn, depth, option, moveNumber)
                 break
         else: # minTurn
             if score < beta:                                                                        # trying to minimise the score
                 beta = score
+                bestMove = option
+                if hooks is not None:
+                    hooks.onBestUpdate(game, maxTurn, depth, option, score)
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.recordCutoff(option, maxTurn, depth, maxDepth - depth, moveNumber)
+                if hooks is not None:
+                    hooks.onCutoff(game, maxTurn, depth, option, moveNumber)
                 break
 
     if maxTurn:
@@ -117,6 +347,133 @@ def alphabeta(game, maxTurn, alpha, beta, depth):
     else:
         bestScore = beta
 
+    # Remember the result, noting whether it is only a bound because the search was cut off,
+    # and whether it is good for any depth because nothing below was cut off by depth
+    if table is not None:
+        if bestScore <= originalAlpha:
+            flag = UPPERBOUND
+        elif bestScore >= originalBeta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        if limits is not None and limits.depthCutoffs == cutoffsBefore:
+            table.store(key, bestScore, RESOLVED_DEPTH, flag, bestMove)
+        else:
+            table.store(key, bestScore, maxDepth - depth, flag, bestMove)
+
+    return bestScore
+
+
+def negamax(game, maxTurn, alpha, beta, depth, table=None, limits=None, ordering=None, hooks=None):
+    """
+    Apply the negamax form of alpha-beta pruning recursively, with principal variation search.
+    Scores are from the point of view of the side to move, so both sides maximise, and alpha and beta
+    are swapped and negated for each move down the tree.
+    The first move at each node is searched with the full window.  The rest are searched with a null
+    window, which only tells us whether they beat the first, and are searched again properly if they do.
+    The null window relies on game scores being whole numbers.
+    limits, ordering and hooks are as for alphabeta().  Hooks are given scores from the computer's
+    point of view, as the other algorithms give them.
+    """
+
+    if limits is None:
+        maxDepth = game.maxDepth
+    else:
+        limits.visitNode()
+        maxDepth = limits.maxDepth
+    if hooks is not None:
+        hooks.onNode(game, maxTurn, depth)
+    colour = 1 if maxTurn else -1                                                                   # turns the computer's score into ours
+
+    # Get the score for the current game
+    score, gameOver = game.getScore()
+
+    # If we have reached the end of the game or reached the max depth then return the score
+    if gameOver or depth==maxDepth:
+        if not gameOver and limits is not None:
+            limits.depthCutoffs += 1
+        if hooks is not None:
+            hooks.onLeaf(game, maxTurn, depth, score, gameOver)
+        return colour * score
+
+    # If we have already searched this state deep enough then reuse the score, or narrow the window.
+    # The table holds scores from the computer's point of view, so it can be shared with alphabeta()
+    originalAlpha = alpha
+    if table is not None:
+        key = (game.getKey(), maxTurn)
+        entry = table.lookup(key, maxDepth - depth)
+        if entry is not None:
+            score, flag, entryDepth = entry
+            score = colour * score
+            if not maxTurn and flag != EXACT:
+                flag = LOWERBOUND if flag == UPPERBOUND else UPPERBOUND
+            if flag == EXACT:
+                alpha = beta = score
+            elif flag == LOWERBOUND and score > alpha:
+                alpha = score
+            elif flag == UPPERBOUND and score < beta:
+                beta = score
+            if alpha >= beta:
+                if entryDepth != RESOLVED_DEPTH and limits is not None:
+                    limits.depthCutoffs += 1                                                        # the stored search was cut off by depth too
+                return score
+        if limits is not None:
+            cutoffsBefore = limits.depthCutoffs
+
+    # Put the moves most likely to cause a cutoff first
+    options = game.getPossibleMoves()
+    if ordering is not None:
+        pvMove = table.getMove(key) if table is not None else None
+        options = ordering.orderMoves(game, options, maxTurn, depth, pvMove)
+
+    # Search the tree, generating the values for all the moves
+    bestScore = None
+    bestMove = None
+    inPlace = hasattr(game, "undoMove")
+    for moveNumber, option in enumerate(options):
+        # Try a move, all the way down the tree
+        if inPlace:
+            newGame = game
+        else:
+            newGame = game.copy()
+        newGame.applyMove(option, maxTurn)
+        if moveNumber == 0:
+            score = -negamax(newGame, not maxTurn, -beta, -alpha, depth+1, table, limits, ordering, hooks)
+        else:
+            score = -negamax(newGame, not maxTurn, -alpha-1, -alpha, depth+1, table, limits, ordering, hooks)
+            if alpha < score < beta:
+                score = -negamax(newGame, not maxTurn, -beta, -score, depth+1, table, limits, ordering, hooks)   # it beat the first move, so find by how much
+        if inPlace:
+            game.undoMove(option)
+
+        # Check if this move beats our best move
+        if bestScore is None or score > bestScore:
+            bestScore = score
+            if score > alpha:
+                alpha = score
+                bestMove = option
+                if hooks is not None:
+                    hooks.onBestUpdate(game, maxTurn, depth, option, colour * score)
+        if alpha >= beta:
+            if ordering is not None:
+                ordering.recordCutoff(option, maxTurn, depth, maxDepth - depth, moveNumber)
+            if hooks is not None:
+                hooks.onCutoff(game, maxTurn, depth, option, moveNumber)
+            break
+
+    # Remember the result from the computer's point of view, noting whether it is only a bound
+    if table is not None:
+        if bestScore <= originalAlpha:
+            flag = UPPERBOUND if maxTurn else LOWERBOUND
+        elif bestScore >= beta:
+            flag = LOWERBOUND if maxTurn else UPPERBOUND
+        else:
+            flag = EXACT
+        if limits is not None and limits.depthCutoffs == cutoffsBefore:
+            table.store(key, colour * bestScore, RESOLVED_DEPTH, flag, bestMove)
+        else:
+            table.store(key, colour * bestScore, maxDepth - depth, flag, bestMove)
+
     return bestScore
 
 
@@ -131,37 +488,366 @@ def computerMoveRandom(game):
 
 
 
-def computerMoveMinimax(game, algorithm):
-    """Generate a move based on the minimax algorithm"""
+def uniqueMoves(game, moves):
+    """
+    Group the given moves into sets that the symmetries of the game state map onto each other, so
+    that only one of each set needs to be searched.  Without getSymmetries() each move is on its own.
+    Returns a dictionary mapping the first move of each set to a list of all the moves in it.
+    """
+
+    if not hasattr(game, "getSymmetries"):
+        return {move: [move] for move in moves}
+
+    symmetries = game.getSymmetries()
+    equivalents = {}
+    for move in moves:
+        for transform in symmetries:
+            image = game.transformMove(move, transform)
+            if image in equivalents:
+                equivalents[image].append(move)
+                break
+        else:
+            equivalents[move] = [move]
+
+    return equivalents
+
+
+def computerMoveMinimax(game, algorithm, table=None, limits=None, ordering=None, hooks=None, stats=False):
+    """
+    Generate a move based on the minimax algorithm.
+    Moves that are symmetries of each other (see uniqueMoves()) are only searched once.
+    table is an optional TranspositionTable, which can be kept between moves.  If none is given
+    and the game provides getKey() then a new table is used for this move.
+    limits is an optional SearchLimits; by default the search goes to game.maxDepth.
+    ordering is an optional MoveOrdering for alpha-beta and negamax; by default all the heuristics are used.
+    hooks is an optional SearchHooks (see searchhooks.py), passed on to the search below each move.
+    If stats is True, the search is counted by a SearchStats (see searchstats.py), which takes the
+    place of hooks, and a (move, stats) tuple is returned.
+    """
+
+    if stats:
+        if hooks is not None:
+            raise ValueError("stats can't be collected as well as calling other hooks")
+        if table is None and hasattr(game, "getKey"):
+            table = TranspositionTable()
+        searchStats = SearchStats(table)
+        move = computerMoveMinimax(game, algorithm, table, limits, ordering, searchStats)
+        searchStats.stop()
+        return move, searchStats
+
+    if algorithm==ALG_NEGAMAX:
+        return computerMoveNegamax(game, table, limits, ordering, hooks=hooks)[0]
+
+    if table is None and hasattr(game, "getKey"):
+        table = TranspositionTable()
+    if limits is None:
+        limits = SearchLimits(game.maxDepth)
+    if ordering is None and algorithm==ALG_ALPHABETA:
+        ordering = MoveOrdering()
 
     # Search the tree, generating the values for all the moves
     bestScore = None
     bestOptions = []
-    shortestPath = 99999
-    for option in game.getPossibleMoves():
+    inPlace = hasattr(game, "undoMove")
+    equivalents = uniqueMoves(game, game.getPossibleMoves())
+    for option in equivalents:
         # Try a move, all the way down the tree
-        newGame = game.copy()
+        if inPlace:
+            newGame = game
+        else:
+            newGame = game.copy()
         newGame.applyMove(option, True)
 
         # Recurse down the tree
         if algorithm==ALG_MINIMAX:
-            score = minimax(newGame, False, depth=0)
+            score = minimax(newGame, False, 0, table, limits, hooks)
         else:
-            score = alphabeta(newGame, False, -200, 200, depth=0)
+            score = alphabeta(newGame, False, -INFINITY, INFINITY, 0, table, limits, ordering, hooks=hooks)
+        if inPlace:
+            game.undoMove(option)
 
-        # Check if this move beats our best move
+        # Check if this move, and those equivalent to it, beat our best move
         if bestScore is None or score > bestScore:
             # First option or best score
             bestScore = score
-            bestOptions = [option]
-            shortestPath = len(path)
-        elif score == bestScore and len(path) < shortestPath:
-            # Same score but shorter path to it
+            bestOptions = list(equivalents[option])
+        elif score == bestScore:
+            # Same score
+            bestOptions.extend(equivalents[option])
+
+    # Apply the winning move (randomly choose from moves with equal best score)
+    move = random.choice(bestOptions)
+
+    return move
+
+
+def computerMoveNegamax(game, table=None, limits=None, ordering=None, guess=None, window=ASPIRATION_WINDOW, hooks=None):
+    """
+    Generate a move based on the negamax algorithm with principal variation search.
+    If guess is given, e.g. the score from a shallower search, the search starts with an aspiration
+    window of guess +/- window, which prunes more, and only widens it if the score falls outside.
+    Unlike computerMoveMinimax(), only the moves that might beat the first are searched exactly, so
+    this plays the first best move found rather than a random one of the equal best.
+    hooks is an optional SearchHooks, passed on to the search below each move.
+    Returns a (move, score) tuple.
+    """
+
+    if table is None and hasattr(game, "getKey"):
+        table = TranspositionTable()
+    if limits is None:
+        limits = SearchLimits(game.maxDepth)
+    if ordering is None:
+        ordering = MoveOrdering()
+
+    if guess is None:
+        alpha, beta = -INFINITY, INFINITY
+    else:
+        alpha, beta = guess - window, guess + window
+
+    # Put the best move from any earlier search first
+    key = (game.getKey(), True) if table is not None else None
+    pvMove = table.getMove(key) if table is not None else None
+    options = ordering.orderMoves(game, game.getPossibleMoves(), True, -1, pvMove)
+
+    while True:
+        # Search the root moves, just as negamax() does below the root
+        bestScore = None
+        bestMove = None
+        searchAlpha = alpha
+        inPlace = hasattr(game, "undoMove")
+        for moveNumber, option in enumerate(options):
+            if inPlace:
+                newGame = game
+            else:
+                newGame = game.copy()
+            newGame.applyMove(option, True)
+            if moveNumber == 0:
+                score = -negamax(newGame, False, -beta, -searchAlpha, 0, table, limits, ordering, hooks)
+            else:
+                score = -negamax(newGame, False, -searchAlpha-1, -searchAlpha, 0, table, limits, ordering, hooks)
+                if searchAlpha < score < beta:
+                    score = -negamax(newGame, False, -beta, -score, 0, table, limits, ordering, hooks)
+            if inPlace:
+                game.undoMove(option)
+
+            if bestScore is None or score > bestScore:
+                bestScore = score
+                bestMove = option
+                if score > searchAlpha:
+                    searchAlpha = score
+            if searchAlpha >= beta:
+                break
+
+        # If the score fell outside the aspiration window, search again with that side opened up
+        if bestScore <= alpha and alpha > -INFINITY:
+            alpha = -INFINITY
+        elif bestScore >= beta and beta < INFINITY:
+            beta = INFINITY
+        else:
+            break
+
+    if table is not None:
+        table.store(key, bestScore, limits.maxDepth + 1, EXACT, bestMove)
+
+    return bestMove, bestScore
+
+
+def computerMoveIterative(game, algorithm, timeLimit=None, nodeLimit=None, table=None, ordering=None):
+    """
+    Generate a move by searching one ply deeper each time, up to game.maxDepth, until the time
+    limit (in seconds) or node limit runs out.  The node limit covers all the searches together.
+    The search that is running when the budget runs out is abandoned, and the move from the
+    deepest completed search is used.
+    Returns a (move, depth) tuple, where depth is the number of plies that search looked ahead,
+    or 0 if not even a one ply search completed, in which case the move is random.
+    """
+
+    if table is None and hasattr(game, "getKey"):
+        table = TranspositionTable()
+    if ordering is None and algorithm in (ALG_ALPHABETA, ALG_NEGAMAX):
+        ordering = MoveOrdering()                                                                   # keep what is learnt between iterations
+    limits = SearchLimits(0, timeLimit, nodeLimit)
+
+    move = None
+    score = None
+    depthReached = 0
+    for maxDepth in range(0, game.maxDepth + 1):
+        limits.maxDepth = maxDepth
+        limits.depthCutoffs = 0
+        try:
+            # Search a copy, so an abandoned search can't leave moves applied to the game.
+            # Negamax uses the score from the last search to set its aspiration window
+            if algorithm==ALG_NEGAMAX:
+                move, score = computerMoveNegamax(game.copy(), table, limits, ordering, score)
+            else:
+                move = computerMoveMinimax(game.copy(), algorithm, table, limits, ordering)
+        except SearchAborted:
+            break
+        depthReached = maxDepth + 1
+
+        # If no node was cut off by the depth limit then searching deeper would find nothing new
+        if limits.depthCutoffs == 0:
+            break
+
+    if move is None:
+        move = computerMoveRandom(game)
+
+    return move, depthReached
+
+
+# -------------------------------------------------------------------------------------------------
+# Parallel search
+# -------------------------------------------------------------------------------------------------
+
+_workerBestScore = None             # in each worker, the best root score found by any worker so far
+_workerTable = None                 # in each worker, a transposition table kept between searches
+_workerSearch = None                # in each worker, the number of the search _workerTable was last used for
+
+
+def _initWorker(bestScore):
+    """Set up a worker process for SearchPool"""
+
+    global _workerBestScore, _workerTable
+    _workerBestScore = bestScore
+    _workerTable = TranspositionTable()
+
+
+def _searchRootMove(game, option, algorithm, maxDepth, search, keepTable):
+    """
+    Search the subtree below one root move, in a worker process.
+    The search only needs to tell whether the move is at least as good as the best root move found
+    so far by any worker, so that score is used to narrow the alpha-beta window.  It is read again
+    before each reply to the root move is searched, so a better score found by another worker in the
+    meantime narrows the window for the replies left.  Deeper than that the window can't be narrowed,
+    since alpha is passed down the tree rather than read from the shared score.
+    maxDepth is the depth to search to, since copies of the game are made with the default depth.
+    search is the number of the search from the root, so the worker's table is aged once per search,
+    or cleared if keepTable is False.
+    Returns an (option, score, nodes) tuple.  A score below the best so far is only an upper bound.
+    """
+
+    global _workerSearch
+    game.applyMove(option, True)                                                                    # game is this worker's own copy
+    table = _workerTable if hasattr(game, "getKey") else None
+    if table is not None and search != _workerSearch:
+        if keepTable:
+            table.newSearch()
+        else:
+            table.clear()
+        _workerSearch = search
+    limits = SearchLimits(maxDepth)
+
+    score, gameOver = game.getScore()
+    if algorithm==ALG_MINIMAX:
+        score = minimax(game, False, 0, table, limits)                                              # no window to narrow
+    elif not gameOver and maxDepth > 0:
+        # Search the replies here rather than in alphabeta(), so the window can be narrowed between them
+        ordering = MoveOrdering()
+        pvMove = table.getMove((game.getKey(), False)) if table is not None else None
+        replies = ordering.orderMoves(game, game.getPossibleMoves(), False, 0, pvMove)
+        inPlace = hasattr(game, "undoMove")
+        beta = INFINITY
+        for moveNumber, reply in enumerate(replies):
+            # Keep the window open by one below the best so far, so moves scoring the same still get their exact score
+            bestSoFar = _workerBestScore.value
+            alpha = bestSoFar - 1 if bestSoFar > -INFINITY else -INFINITY
+            if beta <= alpha:
+                break                                                                               # already shown to be worse
+
+            if inPlace:
+                newGame = game
+            else:
+                newGame = game.copy()
+            newGame.applyMove(reply, False)
+            if algorithm==ALG_NEGAMAX:
+                score = negamax(newGame, True, alpha, beta, 1, table, limits, ordering)             # the computer is to move, so no change of sign
+            else:
+                score = alphabeta(newGame, True, alpha, beta, 1, table, limits, ordering)
+            if inPlace:
+                game.undoMove(reply)
+
+            if score < beta:
+                beta = score
+            if beta <= alpha:
+                ordering.recordCutoff(reply, False, 0, maxDepth, moveNumber)
+                break
+        score = beta
+
+    with _workerBestScore.get_lock():
+        if score > _workerBestScore.value:
+            _workerBestScore.value = int(score)
+
+    return option, score, limits.nodes
+
+
+class SearchPool:
+    """
+    A pool of worker processes for searching the moves at the root of the tree in parallel.
+    The game states are sent to the workers, so they must be picklable, which means the game class
+    must be importable from its module without side effects.
+    Create the pool once and keep it for the whole game, since starting the workers is slow.
+    Each worker keeps a transposition table from one search to the next, unless keepTables is False,
+    when each search starts with empty tables, e.g. to time searches on their own.
+    The number of nodes the workers visited in the last search is returned by getStats().
+    """
+
+    def __init__(self, workers=None, keepTables=True):
+        """Start the pool, with one worker per CPU by default"""
+
+        self.bestScore = multiprocessing.Value('i', -INFINITY)
+        self.searches = 0                                                                           # so the workers can tell when a new search starts
+        self.keepTables = keepTables
+        self.nodes = 0
+        self.executor = ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(self.bestScore,))
+
+    def getStats(self):
+        """Return the counters for the last search as a dictionary"""
+
+        return {"nodes": self.nodes}
+
+    def shutdown(self):
+        """Stop the worker processes"""
+
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+def computerMoveParallel(game, algorithm, pool):
+    """
+    Generate a move based on the minimax algorithm, searching each root move in a separate process.
+    pool is a SearchPool.  As each worker finishes it shares its score, so that moves searched later
+    only need to be searched well enough to show they are worse.
+    Moves with equal best scores are chosen between randomly, as in computerMoveMinimax().
+    """
+
+    # Hand out the most promising moves first, so the shared score is a good one early on
+    options = list(game.getPossibleMoves())
+    if hasattr(game, "orderMoves"):
+        options = list(game.orderMoves(options))
+
+    pool.bestScore.value = -INFINITY
+    pool.searches += 1
+    pool.nodes = 0
+    futures = [pool.executor.submit(_searchRootMove, game.copy(), option, algorithm, game.maxDepth, pool.searches, pool.keepTables)
+               for option in options]
+
+    # Check if each move beats our best move
+    bestScore = None
+    bestOptions = []
+    for future in futures:
+        option, score, nodes = future.result()
+        pool.nodes += nodes
+        if bestScore is None or score > bestScore:
+            # First option or best score
             bestScore = score
             bestOptions = [option]
-            shortestPath = len(path)
-        elif score == bestScore and len(path) == shortestPath:
-            # Same score and same path length
+        elif score == bestScore:
+            # Same score
             bestOptions.append(option)
 
     # Apply the winning move (randomly choose from moves with equal best score)
@@ -169,13 +855,598 @@ def computerMoveMinimax(game, algorithm):
 
     return move
 
-def computerMove(game, algorithm=ALG_RANDOM):
+
+def _lazySMPHelper(game, table, helperNumber):
+    """
+    Search the same tree as the main Lazy SMP search, in a helper process, until it is stopped.
+    Each helper shuffles its moves differently before ordering them, and odd numbered helpers skip
+    the shallowest search so they keep a ply ahead of the others.  The results only matter through
+    what the helper leaves in the shared transposition table.
+    """
+
+    ordering = MoveOrdering(generator=random.Random(helperNumber))
+    limits = SearchLimits(0)
+    for maxDepth in range(helperNumber % 2, game.maxDepth + 1):
+        limits.maxDepth = maxDepth
+        limits.depthCutoffs = 0
+        computerMoveMinimax(game.copy(), ALG_ALPHABETA, table, limits, ordering)
+        if limits.depthCutoffs == 0:
+            break
+
+
+def computerMoveLazySMP(game, workers=None, timeLimit=None, nodeLimit=None, table=None):
+    """
+    Generate a move by iterative deepening alpha-beta, with helper processes searching the same tree
+    at the same time.  Nothing is shared but the transposition table, so the helpers speed the main
+    search up by filling the table with results it would otherwise have to search for itself.
+    workers is the total number of processes searching, by default one per CPU.
+    table is an optional SharedTranspositionTable, which can be kept between moves.  The game must
+    provide getKey() returning an integer, such as a Zobrist key, so keys match in every process.
+    The time and node limits only apply to the main search, as in computerMoveIterative().
+    Returns a (move, depth) tuple, as computerMoveIterative() does.
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    ownTable = table is None
+    if ownTable:
+        table = SharedTranspositionTable()
+
+    helpers = [multiprocessing.Process(target=_lazySMPHelper, args=(game.copy(), table, helperNumber), daemon=True)
+               for helperNumber in range(1, workers)]
+    try:
+        for helper in helpers:
+            helper.start()
+        move, depth = computerMoveIterative(game, ALG_ALPHABETA, timeLimit, nodeLimit, table)
+    finally:
+        # The table has no locks, so stopping a helper half way through a write does no harm
+        for helper in helpers:
+            if helper.is_alive():
+                helper.terminate()
+            helper.join()
+        if ownTable:
+            table.close()
+
+    return move, depth
+
+
+# -------------------------------------------------------------------------------------------------
+# Young brothers wait parallel search
+# -------------------------------------------------------------------------------------------------
+
+# Fields of each split point in YBWPool.slots
+_GENERATION = 0     # incremented each time the slot is reused, so work for an old split point can be spotted
+_NEXT = 1           # the next move at the split point for a process to claim
+_COUNT = 2          # the number of moves at the split point
+_CANCELLED = 3      # set once the split point's results are no longer wanted
+_BOUND = 4          # the best score found at the split point so far
+_SLOT_FIELDS = 5
+
+# Counters in YBWPool.stats
+_STAT_NAMES = ("splits", "steals", "nodes", "wastedNodes", "cancelledTasks")
+_SPLITS, _STEALS, _NODES, _WASTED_NODES, _CANCELLED_TASKS, _BUSY = range(6)
+
+
+class SplitLimits(SearchLimits):
+    """
+    Limits for a search by a YBWPool process.  There is no budget, but the search is aborted with
+    SearchAborted once any of the split points it is doing work for has been cancelled.
+    """
+
+    def __init__(self, maxDepth, pool):
+        """Set the limits up for a search to the given depth"""
+
+        super().__init__(maxDepth)
+        self.pool = pool
+        self.watching = []                                                                          # (slot, generation) of split points worked for
+
+    def visitNode(self):
+        """Count a node, aborting the search if its work is no longer wanted"""
+
+        self.nodes += 1
+        if self.nodes % CANCEL_CHECK_NODES == 0 and self.pool.isCancelled(self.watching):
+            raise SearchAborted("Split point cancelled")
+
+
+class YBWPool:
+    """
+    A pool of worker processes for the young brothers wait parallel alpha-beta search.
+    At each node the first move is searched before anything else, since it often causes a cutoff on
+    its own.  The remaining moves, the younger brothers, then become a split point: the process that
+    owns the node searches them one by one, and any idle worker can steal them from it.  When a move
+    causes a cutoff the split point is cancelled, and workers still searching its moves give up.
+    Workers can open split points of their own below the moves they steal.
+    The processes share a SharedTranspositionTable, so the game's getKey() should return an integer.
+    The counters are reset for each move, and are returned by getStats().
+    Create the pool once and keep it for the whole game, since starting the workers is slow.
+    """
+
+    def __init__(self, workers=None):
+        """Start the pool, with one process per CPU by default, including the one calling it"""
+
+        self.workers = workers or os.cpu_count() or 1
+        self.lock = multiprocessing.Lock()
+        self.slots = multiprocessing.RawArray('q', self.workers * SPLIT_SLOTS * _SLOT_FIELDS)
+        self.stats = multiprocessing.RawArray('q', len(_STAT_NAMES) + 1)                           # the counters, then the number of busy workers
+        self.tickets = multiprocessing.Queue()                                                      # split points open for stealing
+        self.results = [multiprocessing.Queue() for _ in range(self.workers)]                       # results for each process's split points
+        self.table = SharedTranspositionTable()
+        self.processNumber = 0
+        self.openSplits = 0
+        self.pending = {}                                                                           # slot -> results that arrived while busy elsewhere
+        self.processes = [multiprocessing.Process(target=_ybwWorker, args=(self, processNumber), daemon=True)
+                          for processNumber in range(1, self.workers)]
+        for process in self.processes:
+            process.start()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["processes"]
+        return state
+
+    def shutdown(self):
+        """Stop the worker processes and free the transposition table"""
+
+        for process in self.processes:
+            self.tickets.put(None)
+        for process in self.processes:
+            process.join()
+        self.table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def clearStats(self):
+        """Reset the counters"""
+
+        with self.lock:
+            for counter in range(len(_STAT_NAMES)):
+                self.stats[counter] = 0
+
+    def addStats(self, counter, amount=1):
+        """Add to one of the counters"""
+
+        with self.lock:
+            self.stats[counter] += amount
+
+    def getStats(self):
+        """Return the counters as a dictionary"""
+
+        stats = dict(zip(_STAT_NAMES, self.stats))
+        stats["wastedRate"] = stats["wastedNodes"] / stats["nodes"] if stats["nodes"] else 0.0
+        return stats
+
+    def isCancelled(self, watching):
+        """Has any of the given (slot, generation) split points been cancelled or reused?"""
+
+        for slot, generation in watching:
+            base = slot * _SLOT_FIELDS
+            if self.slots[base + _GENERATION] != generation or self.slots[base + _CANCELLED]:
+                return True
+
+        return False
+
+    def claim(self, slot, generation):
+        """
+        Claim the next unsearched move at a split point.
+        Returns a (move index, best score so far) tuple, or None if there are none left.
+        """
+
+        base = slot * _SLOT_FIELDS
+        with self.lock:
+            if self.slots[base + _GENERATION] != generation or self.slots[base + _CANCELLED]:
+                return None
+            index = self.slots[base + _NEXT]
+            if index >= self.slots[base + _COUNT]:
+                return None
+            self.slots[base + _NEXT] = index + 1
+            return index, self.slots[base + _BOUND]
+
+    def collectResults(self, slot, generation, limits, block):
+        """
+        Collect the results workers have sent for the given split point.
+        Results for the caller's other open split points are kept until they are asked for, and
+        results for cancelled split points are thrown away.  If block is True, wait for at least one.
+        Returns a list of (move index, score) tuples.
+        """
+
+        found = self.pending[slot]
+        self.pending[slot] = []
+        while True:
+            try:
+                message = self.results[self.processNumber].get(block and not found, 0.01)
+            except queue.Empty:
+                if found or not block:
+                    return found
+                if self.isCancelled(limits.watching):
+                    raise SearchAborted("Split point cancelled")
+                continue
+
+            messageSlot, messageGeneration, index, score, nodes, depthCutoffs = message
+            if messageSlot in self.pending and self.slots[messageSlot * _SLOT_FIELDS + _GENERATION] == messageGeneration:
+                limits.depthCutoffs += depthCutoffs                                                 # so resolved results are only stored if they are
+                if messageSlot == slot:
+                    found.append((index, score))
+                else:
+                    self.pending[messageSlot].append((index, score))
+            else:
+                self.addStats(_WASTED_NODES, nodes)
+
+    def split(self, game, options, maxTurn, alpha, beta, depth, table, limits, ordering):
+        """
+        Search the given younger brothers at a node, sharing them with any idle workers.
+        Returns an (alpha, beta, index, cutoff) tuple, where index is the position in options of the
+        move that set the best score, or None if none improved on the score the node already had.
+        """
+
+        slot = self.processNumber * SPLIT_SLOTS + self.openSplits
+        base = slot * _SLOT_FIELDS
+        with self.lock:
+            generation = self.slots[base + _GENERATION] + 1
+            self.slots[base + _GENERATION] = generation
+            self.slots[base + _NEXT] = 0
+            self.slots[base + _COUNT] = len(options)
+            self.slots[base + _CANCELLED] = 0
+            self.slots[base + _BOUND] = alpha if maxTurn else beta
+            self.stats[_SPLITS] += 1
+        self.openSplits += 1
+        self.pending[slot] = []
+
+        # Put a ticket in the queue for each worker that could help
+        ticket = (slot, generation, game.copy(), options, maxTurn, alpha, beta, depth, limits.maxDepth)
+        for _ in range(min(len(options), self.workers - 1)):
+            self.tickets.put(ticket)
+
+        bestIndex = None
+        remaining = len(options)
+        inPlace = hasattr(game, "undoMove")
+        try:
+            while remaining > 0:
+                # Search the next move ourselves, or if the workers have them all, wait for their results
+                claimed = self.claim(slot, generation)
+                results = []
+                if claimed is not None:
+                    index = claimed[0]
+                    option = options[index]
+                    if inPlace:
+                        newGame = game
+                    else:
+                        newGame = game.copy()
+                    newGame.applyMove(option, maxTurn)
+                    score = alphabeta(newGame, not maxTurn, alpha, beta, depth+1, table, limits, ordering, self)
+                    if inPlace:
+                        game.undoMove(option)
+                    results.append((index, score))
+                results += self.collectResults(slot, generation, limits, claimed is None)
+
+                # Check if these moves beat our best move
+                for index, score in results:
+                    remaining -= 1
+                    if maxTurn and score > alpha:
+                        alpha = score
+                        bestIndex = index
+                    elif not maxTurn and score < beta:
+                        beta = score
+                        bestIndex = index
+                if alpha >= beta:
+                    return alpha, beta, bestIndex, True
+                self.slots[base + _BOUND] = alpha if maxTurn else beta
+
+            return alpha, beta, bestIndex, False
+        finally:
+            # Stop any workers still searching moves here, since their results can't matter now
+            self.slots[base + _CANCELLED] = 1
+            self.openSplits -= 1
+            del self.pending[slot]
+
+    def helpWithSplit(self, ticket, ordering):
+        """In a worker, search moves from another process's split point until none are left"""
+
+        slot, generation, game, options, maxTurn, alpha, beta, depth, maxDepth = ticket
+        owner = slot // SPLIT_SLOTS
+        table = self.table if hasattr(game, "getKey") else None
+        limits = SplitLimits(maxDepth, self)
+        limits.watching.append((slot, generation))
+        while True:
+            claimed = self.claim(slot, generation)
+            if claimed is None:
+                break
+            index, bound = claimed
+            if maxTurn:
+                alpha = max(alpha, bound)
+            else:
+                beta = min(beta, bound)
+
+            nodesBefore = limits.nodes
+            depthCutoffsBefore = limits.depthCutoffs
+            newGame = game.copy()
+            newGame.applyMove(options[index], maxTurn)
+            try:
+                score = alphabeta(newGame, not maxTurn, alpha, beta, depth+1, table, limits, ordering, self)
+            except SearchAborted:
+                nodes = limits.nodes - nodesBefore
+                with self.lock:
+                    self.stats[_NODES] += nodes
+                    self.stats[_WASTED_NODES] += nodes
+                    self.stats[_CANCELLED_TASKS] += 1
+                break
+
+            nodes = limits.nodes - nodesBefore
+            with self.lock:
+                self.stats[_NODES] += nodes
+                self.stats[_STEALS] += 1
+            self.results[owner].put((slot, generation, index, score, nodes, limits.depthCutoffs - depthCutoffsBefore))
+
+    def finishSearch(self, limits):
+        """
+        Wait for the workers to stop, then count the nodes the caller searched and any results that
+        arrived too late to be used, so the counters are complete.
+        """
+
+        while self.stats[_BUSY] > 0:
+            time.sleep(0.001)
+        self.addStats(_NODES, limits.nodes)
+        while True:
+            try:
+                message = self.results[self.processNumber].get(True, 0.01)
+            except queue.Empty:
+                break
+            self.addStats(_WASTED_NODES, message[4])
+
+
+def _ybwWorker(pool, processNumber):
+    """Run a YBWPool worker process, helping with whichever split points are open"""
+
+    pool.processNumber = processNumber
+    ordering = MoveOrdering()
+    while True:
+        ticket = pool.tickets.get()
+        if ticket is None:
+            break
+        pool.addStats(_BUSY)
+        try:
+            pool.helpWithSplit(ticket, ordering)
+        finally:
+            pool.addStats(_BUSY, -1)
+
+
+def computerMoveYBW(game, pool):
+    """
+    Generate a move based on the alpha-beta algorithm, with the young brothers wait parallel search.
+    pool is a YBWPool.  Only moves that might beat the first are searched exactly, so this plays the
+    first best move found rather than a random one of the equal best.
+    """
+
+    pool.clearStats()
+    table = pool.table if hasattr(game, "getKey") else None
+    limits = SplitLimits(game.maxDepth, pool)
+    ordering = MoveOrdering()
+    options = list(game.getPossibleMoves())
+    if hasattr(game, "orderMoves"):
+        options = list(game.orderMoves(options))
+
+    # Search the first move on its own, then share out the rest
+    newGame = game.copy()
+    newGame.applyMove(options[0], True)
+    score = alphabeta(newGame, False, -INFINITY, INFINITY, 0, table, limits, ordering, pool)
+    move = options[0]
+    if len(options) > 1:
+        alpha, beta, index, cutoff = pool.split(game, options[1:], True, score, INFINITY, -1, table, limits, ordering)
+        if index is not None:
+            move = options[1 + index]
+    pool.finishSearch(limits)
+
+    return move
+
+
+# -------------------------------------------------------------------------------------------------
+# Pondering
+# -------------------------------------------------------------------------------------------------
+
+class PonderLimits(SearchLimits):
+    """
+    Limits for a ponder search.  There is no budget, but the search is aborted with SearchAborted as
+    soon as the given threading.Event is set.
+    """
+
+    def __init__(self, maxDepth, stopped):
+        """Set the limits up for a search to the given depth"""
+
+        super().__init__(maxDepth)
+        self.stopped = stopped
+
+    def visitNode(self):
+        """Count a node, aborting the search if pondering has been stopped"""
+
+        self.nodes += 1
+        if self.stopped.is_set():
+            raise SearchAborted("Pondering stopped")
+
+
+class Ponderer:
+    """
+    Searches for the computer's answers to the player's likely replies in a background thread, while
+    the player thinks about which to make.
+    The replies are searched as computerMove() would search them, starting with the reply the last
+    search expected: straight to game.maxDepth one after the other if there are no limits, otherwise
+    by iterative deepening, one ply deeper for every reply in turn.  A thread is enough, as input()
+    lets it have the CPU while it waits.  The searches use the game's transposition table, so a reply
+    that wasn't searched far enough still leaves the search that follows it with a head start.
+    The player's reply is a hit if the search for it went as far as computerMove() would have gone:
+    to the end of its depth if there are no limits, otherwise for the time or node limit.
+    The reply the player made is recognised by its position's getKey(), so games without getKey()
+    can't be pondered.
+    """
+
+    def __init__(self, game, algorithm, table=None, timeLimit=None, nodeLimit=None, replies=PONDER_REPLIES):
+        """
+        Get ready to ponder the given number of the player's replies in the given game, which is
+        copied, with the player to move.  algorithm must be one of PONDER_ALGORITHMS, and table,
+        timeLimit and nodeLimit are those that will be given to computerMove().
+        """
+
+        if algorithm not in PONDER_ALGORITHMS:
+            raise ValueError("Pondering isn't supported for algorithm {}".format(algorithm))
+        if not hasattr(game, "getKey"):
+            raise ValueError("Pondering needs the game to provide getKey()")
+
+        self.game = game.copy()
+        self.algorithm = algorithm
+        self.table = table
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+        # Put the reply the last search expected first
+        pvMove = table.getMove((game.getKey(), False)) if table is not None else None
+        options = MoveOrdering().orderMoves(game, game.getPossibleMoves(), False, -1, pvMove)
+        self.results = []                                                                           # what is known about the answer to each reply
+        for option in options[:replies]:
+            newGame = self.game.copy()
+            newGame.applyMove(option, False)
+            self.results.append({"reply": option, "game": newGame, "move": None, "score": None, "depth": 0,
+                                 "nodes": 0, "seconds": 0.0, "finished": newGame.getScore()[1]})
+
+    def start(self):
+        """Start pondering in the background"""
+
+        self.thread.start()
+
+    def stop(self):
+        """Stop pondering, waiting for the current search to give up"""
+
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def run(self):
+        """Search the replies until they are all finished or pondering is stopped"""
+
+        orderings = [MoveOrdering() for result in self.results]                                     # kept between the iterations for each reply
+        deepening = self.timeLimit is not None or self.nodeLimit is not None
+        for maxDepth in range(0 if deepening else self.game.maxDepth, self.game.maxDepth + 1):
+            searching = [index for index, result in enumerate(self.results) if not result["finished"]]
+            if not searching:
+                break
+            for index in searching:
+                result = self.results[index]
+                limits = PonderLimits(maxDepth, self.stopped)
+                start = time.perf_counter()
+                try:
+                    # Search a copy, so an abandoned search can't leave moves applied to the game
+                    if self.algorithm==ALG_NEGAMAX:
+                        move, score = computerMoveNegamax(result["game"].copy(), self.table, limits, orderings[index], result["score"])
+                        result["score"] = score
+                    else:
+                        move = computerMoveMinimax(result["game"].copy(), self.algorithm, self.table, limits, orderings[index])
+                except SearchAborted:
+                    return
+                finally:
+                    result["nodes"] += limits.nodes
+                    result["seconds"] += time.perf_counter() - start
+                result["move"] = move
+                result["depth"] = maxDepth + 1
+                result["finished"] = limits.depthCutoffs == 0 or maxDepth == self.game.maxDepth
+
+    def getMove(self, game):
+        """
+        Return the pondered move for the given game, which must be the pondered game with one of the
+        player's replies applied, or None if that reply wasn't searched far enough.
+        Pondering must have been stopped.
+        """
+
+        for result in self.results:
+            if not self.samePosition(result["game"], game):
+                continue
+            if result["move"] is None:
+                return None
+            if result["finished"]:
+                return result["move"]
+            if self.timeLimit is not None and result["seconds"] >= self.timeLimit:
+                return result["move"]
+            if self.nodeLimit is not None and result["nodes"] >= self.nodeLimit:
+                return result["move"]
+            return None
+
+        return None
+
+    @staticmethod
+    def samePosition(game, otherGame):
+        """Are the two games in the same position?"""
+
+        return game.getKey() == otherGame.getKey()
+
+    def getStats(self):
+        """Return what was found for each reply, in the order they were pondered"""
+
+        return [{name: value for name, value in result.items() if name != "game"} for result in self.results]
+
+
+# -------------------------------------------------------------------------------------------------
+# Playing the game
+# -------------------------------------------------------------------------------------------------
+
+def computerMove(game, algorithm=ALG_RANDOM, table=None, timeLimit=None, nodeLimit=None, pool=None, workers=None, book=None, tree=None, ponderer=None):
+    """
+    Get the computer move and apply it.
+    table can be kept between moves, so that each search starts with the results the earlier ones
+    found below the moves that have been played since.  Each search calls its newSearch() method, so
+    the results for lines the game didn't take can be replaced.
+    If a book is given, e.g. an OxoTable (see oxotable.py), its probe(game) method is asked for a
+    move first, and the algorithm is only used if it returns None.
+    If a time limit (in seconds) or node limit is given, the minimax algorithms use iterative deepening
+    to stay within it.  Otherwise, if a SearchPool is given, they search the root moves in parallel.
+    ALG_LAZYSMP always uses iterative deepening, with the given number of workers, and needs table
+    to be a SharedTranspositionTable if one is given.
+    ALG_YBW searches to game.maxDepth using pool, which must be a YBWPool, or a new pool of the given
+    number of workers if there is none.
+    ALG_MCTS searches for timeLimit seconds or nodeLimit iterations using tree, an MCTS (see mcts.py)
+    which can be kept between moves to reuse what it found, or a new tree if there is none.
+    If a stopped Ponderer is given, a move it found for the player's reply is played without searching.
+    """
+
     # Get computer move and stop if the game is over
     print("\nComputer move:")
-    if algorithm==ALG_MINIMAX:
-        move = computerMoveMinimax(game, ALG_MINIMAX)
+    move = book.probe(game) if book is not None else None
+    pondered = move is None and ponderer is not None
+    if pondered:
+        move = ponderer.getMove(game)
+    if move is None and table is not None:
+        table.newSearch()
+    if move is not None:
+        print("Pondered move" if pondered else "Book move")
+    elif algorithm==ALG_LAZYSMP:
+        move, depth = computerMoveLazySMP(game, workers, timeLimit, nodeLimit, table)
+        print("Searched {} moves ahead".format(depth))
+    elif algorithm==ALG_YBW:
+        if pool is None:
+            with YBWPool(workers) as newPool:
+                move = computerMoveYBW(game, newPool)
+                stats = newPool.getStats()
+        else:
+            move = computerMoveYBW(game, pool)
+            stats = pool.getStats()
+        print("Stole {} moves, wasting {} of {} nodes".format(stats["steals"], stats["wastedNodes"], stats["nodes"]))
+    elif algorithm==ALG_MCTS:
+        if tree is None:
+            tree = MCTS()
+        move = tree.search(game, timeLimit, nodeLimit)
+        print("Ran {iterations} iterations ({iterationsPerSecond:.0f}/sec), the tree has {nodes} nodes, {reusedNodes} kept from the last move".format(**tree.getStats()))
+    elif algorithm in (ALG_MINIMAX, ALG_ALPHABETA, ALG_NEGAMAX) and (timeLimit is not None or nodeLimit is not None):
+        move, depth = computerMoveIterative(game, algorithm, timeLimit, nodeLimit, table)
+        print("Searched {} moves ahead".format(depth))
+    elif algorithm in (ALG_MINIMAX, ALG_ALPHABETA, ALG_NEGAMAX) and pool is not None:
+        move = computerMoveParallel(game, algorithm, pool)
+    elif algorithm==ALG_MINIMAX:
+        move = computerMoveMinimax(game, ALG_MINIMAX, table)
     elif algorithm==ALG_ALPHABETA:
-        move = computerMoveMinimax(game, ALG_ALPHABETA)
+        move = computerMoveMinimax(game, ALG_ALPHABETA, table)
+    elif algorithm==ALG_NEGAMAX:
+        move = computerMoveMinimax(game, ALG_NEGAMAX, table)
     else:
         move = computerMoveRandom(game)
 
@@ -183,21 +1454,53 @@ def computerMove(game, algorithm=ALG_RANDOM):
 
     return move
 
-def play(game, algorithm=ALG_RANDOM):
-    """Execute alternating player / computer moves"""
+def play(game, algorithm=ALG_RANDOM, table=None, timeLimit=None, nodeLimit=None, pool=None, workers=None, book=None, tree=None, ponder=False):
+    """
+    Execute alternating player / computer moves.
+    The transposition table, if any, is kept for the whole game, as is the tree for ALG_MCTS, so each
+    search starts with what the earlier ones found below the moves that have been played since.
+    timeLimit, nodeLimit, pool, workers, book and tree are passed on to computerMove().  For ALG_YBW a
+    YBWPool is started for the game if no pool is given.
+    If ponder is True, the algorithm is one of PONDER_ALGORITHMS and the game provides getKey(), a
+    Ponderer searches the player's likely replies while the player thinks, and is stopped as soon as
+    the player has moved.
+    """
 
-    while True:
-        #Get player move and stop if the game is over
-        game.playerMove()
-        score, gameOver = game.getScore()
-        if gameOver:
-            break
+    if tree is None and algorithm==ALG_MCTS:
+        tree = MCTS()
+    ownTable = table is None and hasattr(game, "getKey") and algorithm!=ALG_MCTS
+    if ownTable:
+        table = SharedTranspositionTable() if algorithm==ALG_LAZYSMP else TranspositionTable()
+    ownPool = pool is None and algorithm==ALG_YBW
+    if ownPool:
+        pool = YBWPool(workers)
 
-        # Get computer move and stop if the game is over
-        computerMove(game, ALG_MINIMAX)
-        score, gameOver = game.getScore()
-        if gameOver:
-            break
+    ponderer = None
+    try:
+        while True:
+            #Get player move and stop if the game is over
+            if ponder and algorithm in PONDER_ALGORITHMS and hasattr(game, "getKey"):
+                ponderer = Ponderer(game, algorithm, table, timeLimit, nodeLimit)
+                ponderer.start()
+            game.playerMove()
+            if ponderer is not None:
+                ponderer.stop()
+            score, gameOver = game.getScore()
+            if gameOver:
+                break
+
+            # Get computer move and stop if the game is over
+            computerMove(game, algorithm, table, timeLimit, nodeLimit, pool, workers, book, tree, ponderer)
+            score, gameOver = game.getScore()
+            if gameOver:
+                break
+    finally:
+        if ponderer is not None:
+            ponderer.stop()
+        if ownTable and algorithm==ALG_LAZYSMP:
+            table.close()
+        if ownPool:
+            pool.shutdown()
 
     # Show the result
     print("\n\nGame Over")
@@ -210,3 +1513,52 @@ def play(game, algorithm=ALG_RANDOM):
     game.show()
 
 
+# -------------------------------------------------------------------------------------------------
+# Code to test the searches
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    from oxo import Oxo
+    from connect4 import Connect4
+
+    # Check the searches visit the same nodes and find the same move with hooks attached as without
+    for newGame, depth in ((Oxo, 9), (Connect4, 6)):
+        for algorithm in (ALG_MINIMAX, ALG_ALPHABETA, ALG_NEGAMAX):
+            if newGame is Connect4 and algorithm == ALG_MINIMAX:
+                depth = 4
+            plain = SearchLimits(depth)
+            random.seed(1)
+            move = computerMoveMinimax(newGame(), algorithm, limits=plain)
+            hooked = SearchLimits(depth)
+            random.seed(1)
+            hookedMove, stats = computerMoveMinimax(newGame(), algorithm, limits=hooked, stats=True)
+            assert (hookedMove == move and hooked.nodes == plain.nodes == stats.nodes)
+
+    # Check the young brothers wait search plays a move as good as a plain alpha-beta search finds,
+    # with and without other workers to steal moves, in some positions from random games
+    generator = random.Random(1)
+    decided = 0                                                                                     # positions where some moves are worse than others
+    with YBWPool(1) as alone, YBWPool(3) as shared:
+        for gameNumber in range(12):
+            game = Connect4()
+            for ply in range(generator.randrange(8, 20, 2)):
+                game.applyMove(generator.choice(list(game.getPossibleMoves())), ply % 2 == 1)
+            if game.getScore()[1]:
+                continue
+            game.maxDepth = 5
+
+            scores = {}
+            for option in game.getPossibleMoves():
+                newGame = game.copy()
+                newGame.applyMove(option, True)
+                scores[option] = alphabeta(newGame, False, -INFINITY, INFINITY, 0, None, SearchLimits(game.maxDepth))
+            if min(scores.values()) < max(scores.values()):
+                decided += 1
+            for pool in (alone, shared):
+                pool.table.clear()
+                move = computerMoveYBW(game, pool)
+                stats = pool.getStats()
+                assert (scores[move] == max(scores.values()))
+                assert (stats["nodes"] > 0 and 0 <= stats["wastedNodes"] <= stats["nodes"])
+            assert (alone.getStats()["steals"] == 0)
+    assert (decided >= 3)
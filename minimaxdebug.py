@@ -1,7 +1,11 @@
 '''
 minimaxdebug.py
 
-Implements a debugging version of the minimax and alpha-beta algorithms found in minimax.py.
+Implements a debugging version of the minimax and alpha-beta algorithms found in minimax.py, which
+shows the score and evaluation path of every move the computer considers.
+
+The search itself is the one in minimax.py, with hooks attached (see searchhooks.py) that count the
+work done and keep track of the evaluation path, so the two can't drift apart.
 
 Requires the implementation of an additional method in the Game class:
 
@@ -10,6 +14,14 @@ Requires the implementation of an additional method in the Game class:
         Show the evaluation path neatly formatted.
         path is a list of (bestScore, state, level) tuples
         """
+
+The search doesn't use a transposition table, even for games that provide getKey().  A position found
+in the table would end its evaluation path there, so the paths would be cut short wherever the search
+had been before, and the shortest path to the best score couldn't be told apart.
+
+The evaluation path is kept as a principal variation of moves (see PrincipalVariation), and the game
+states in it are only made when it is shown, so the search can apply and undo moves in place, if the
+game provides undoMove().
 '''
 
 # -------------------------------------------------------------------------------------------------
@@ -17,191 +29,192 @@ Requires the implementation of an additional method in the Game class:
 # -------------------------------------------------------------------------------------------------
 
 import random
-import numpy as np
+
+from minimax import minimax, alphabeta, computerMoveRandom, INFINITY
+from searchstats import SearchStats
 
 # -------------------------------------------------------------------------------------------------
 # Constants
 # -------------------------------------------------------------------------------------------------
-visitedNodes = 0                                                                                    # debug
-
 ALG_RANDOM  = 0      # use a random play algorithm
 ALG_MINIMAX = 1      # use a minimax algorithm
 ALG_ALPHABETA = 2    # use a minimax algorithm with alpha-beta pruning
 
 
-def minimax(game, maxTurn, depth, path):
-    """Apply the minimax algorithm recursively"""
-
-    global visitedNodes                                                                             # debug
-    visitedNodes += 1                                                                               # debug
-
-    # Get the score for the current game
-    score, gameOver = game.getScore()
-
-    # If we have reached the end of the game or reached the max depth then return the score
-    if gameOver or depth==game.maxDepth:                     
-        path.append((score, game, depth))                                                          # debug
-        return score
-
-    # Search the tree, generating the values for all the moves
-    bestScore = None
-    bestPath = None                                                                                 # debug
-    for option in game.getPossibleMoves():
-        # Try a move, all the way down the tree
-        newGame = game.copy()
-        newGame.applyMove(option, maxTurn)
-        newPath = []                                                                                # debug
-        score = minimax(newGame, not maxTurn, depth+1, newPath)
-
-        # Check if this move beats our best move
-        if maxTurn:
-            if bestScore is None or score > bestScore:                                              # trying to maximise the score
-                bestScore = score
-                bestPath = newPath.copy()                                                           # debug
-        else: # minTurn
-            if bestScore is None or score < bestScore:                                              # trying to minimise the score
-                bestScore = score
-                bestPath = newPath.copy()                                                           # debug
-
-    #if bestScore is None:
-    #    raise Exception("No possible moves found - have you missed a game end scenario?")
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
 
-    # For debug purposes gather the path to the best option decision
-    path.extend(bestPath)                                                                           # debug
-    path.append((bestScore, game, depth))                                                           # debug
+class PrincipalVariation:
+    """
+    The best line of play found by a search, kept in a triangular array.
+    Row ply holds the best line found so far from the node being searched at that depth, from column
+    ply onwards.  When a move improves on the best at a node, the line below it is copied up a row
+    after it, so each node costs a short copy of moves rather than a list of game states.
+    A second array holds the score the search returned for the state each move leads to, copied up
+    with the moves.
+    The game states along the line are only made when path() is asked for them.
+    """
+
+    def __init__(self, size=16):
+        """Set the array up for lines of up to size moves; it grows if a search goes deeper"""
+
+        self.moves = [[None] * size for row in range(size)]
+        self.scores = [[None] * size for row in range(size)]
+        self.lengths = [0] * size                                                                   # where the line in each row ends
+
+    def startNode(self, depth):
+        """Start searching a node at the given depth, with no best line yet"""
+
+        if depth + 1 >= len(self.lengths):
+            size = 2 * (depth + 1)
+            for array in (self.moves, self.scores):
+                for row in array:
+                    row.extend([None] * (size - len(row)))
+                array.extend([None] * size for row in range(size - len(array)))
+            self.lengths.extend([0] * (size - len(self.lengths)))
+        self.lengths[depth] = depth
+
+    def update(self, depth, move, score):
+        """
+        Make the given move, then the best line found by the node below it, the best line at the given depth.
+        score is the score the search returned for the state the move leads to.
+        """
 
-    return bestScore
+        end = self.lengths[depth + 1]
+        row = self.moves[depth]
+        row[depth] = move
+        row[depth + 1:end] = self.moves[depth + 1][depth + 1:end]
+        row = self.scores[depth]
+        row[depth] = score
+        row[depth + 1:end] = self.scores[depth + 1][depth + 1:end]
+        self.lengths[depth] = end
 
+    def length(self, depth=0):
+        """Get the number of moves in the best line at the given depth"""
 
-def alphabeta(game, maxTurn, alpha, beta, depth, path):
-    """Apply the miminax with alpha-beta pruning algorithm recursively"""
+        return self.lengths[depth] - depth
 
-    global visitedNodes                                                                             # debug
-    visitedNodes += 1                                                                               # debug
+    def path(self, game, maxTurn, score, depth=0):
+        """
+        Replay the best line at the given depth from game, the state searched at that depth.
+        score is the score the search returned for game, and each later state has the score its own
+        search returned, which with alpha-beta pruning may only be a bound.
+        Returns a list of (score, game, depth) tuples, for prettyPath(), starting with game.
+        """
 
-    # Get the score for the current game
-    score, gameOver = game.getScore()
+        game = game.copy()
+        path = [(score, game, depth)]
+        end = self.lengths[depth]
+        for move, moveScore in zip(self.moves[depth][depth:end], self.scores[depth][depth:end]):
+            game = game.copy()
+            game.applyMove(move, maxTurn)
+            maxTurn = not maxTurn
+            depth += 1
+            path.append((moveScore, game, depth))
 
-    # If we have reached the end of the game or reached the max depth then return the score
-    if gameOver or depth==game.maxDepth:                     
-        path.append((score, game, depth))                                                          # debug
-        return score
+        return path
 
-    # Search the tree, generating the values for all the moves
-    bestPath = None                                                                                 # debug
-    for option in game.getPossibleMoves():
-        # Try a move, all the way down the tree
-        newGame = game.copy()
-        newGame.applyMove(option, maxTurn)
-        newPath = []                                                                                # debug
-        score = alphabeta(newGame, not maxTurn, alpha, beta, depth+1, newPath)
 
-        # Check if this move beats our best move
-        if maxTurn:
-            if score > alpha:                                                                       # trying to maximise the score
-                alpha = score                                                                       # alpha is the max score so far
-                bestPath = newPath.copy()                                                           # debug
-            if alpha >= beta:
-                break
-        else: # minTurn
-            if score < beta:                                                                        # trying to minimise the score
-                beta = score
-                bestPath = newPath.copy()                                                           # debug
-            if beta <= alpha:
-                break
-
-    #if bestPath is None:
-    #    raise Exception("No possible moves found - have you missed a game end scenario?")
-
-    if maxTurn:
-        bestScore = alpha
-    else:
-        bestScore = beta
+class DebugHooks(SearchStats):
+    """The search hooks for the debug search: the statistics, plus the principal variation to show"""
 
-    # For debug purposes gather the path to the best option decision
-    if bestPath is not None:
-        path.extend(bestPath)                                                                       # debug
-    path.append((bestScore, game, depth))                                                          # debug
+    def __init__(self):
+        """Start the statistics for a new search, with an empty principal variation"""
 
-    return bestScore
+        super().__init__()
+        self.pv = PrincipalVariation()
 
+    def onNode(self, game, maxTurn, depth):
+        """Count the node, and start its line of the principal variation"""
 
-def computerMoveRandom(game):
-    """Generate a random move"""
+        super().onNode(game, maxTurn, depth)
+        self.pv.startNode(depth)
 
-    options = game.getPossibleMoves()
+    def onBestUpdate(self, game, maxTurn, depth, move, score):
+        """Make the line through the given move the best at this depth"""
 
-    move = random.randrange(len(options))
+        self.pv.update(depth, move, score)
 
-    return options[move]
 
+# -------------------------------------------------------------------------------------------------
+# Playing the game
+# -------------------------------------------------------------------------------------------------
 
 def computerMoveMinimax(game, algorithm):
-    """Generate a move based on the minimax algorithm"""
+    """
+    Generate a move based on the minimax algorithm, showing the score and evaluation path of each move.
+    Returns a (move, stats) tuple, where stats is the SearchStats for the search.
+    """
 
-    global visitedNodes                                                                             # debug
-    visitedNodes = 0                                                                                # debug
+    stats = DebugHooks()                                                                            # debug
 
     # Search the tree, generating the values for all the moves
     bestScore = None
     bestOptions = []
     shortestPath = 99999
+    pv = stats.pv                                                                                   # debug
     for option in game.getPossibleMoves():
         # Try a move, all the way down the tree
         newGame = game.copy()
         newGame.applyMove(option, True)
-        path = []                                                                                   # debug
 
         # Recurse down the tree
         if algorithm==ALG_MINIMAX:
-            score = minimax(newGame, False, 0, path)
+            score = minimax(newGame, False, 0, hooks=stats)
         else:
-            score = alphabeta(newGame, False, -200, 200, 0, path)
+            score = alphabeta(newGame, False, -INFINITY, INFINITY, 0, hooks=stats)
+        pathLength = pv.length() + 1                                                                # states on the path, including newGame
 
         # Check if this move beats our best move
         if bestScore is None or score > bestScore:
             # First option or best score
             bestScore = score
             bestOptions = [option]
-            shortestPath = len(path)
-        elif score == bestScore and len(path) < shortestPath:
+            shortestPath = pathLength
+        elif score == bestScore and pathLength < shortestPath:
             # Same score but shorter path to it
             bestScore = score
             bestOptions = [option]
-            shortestPath = len(path)
-        elif score == bestScore and len(path) == shortestPath:
+            shortestPath = pathLength
+        elif score == bestScore and pathLength == shortestPath:
             # Same score and same path length
             bestOptions.append(option)
 
 
-        path.reverse()                                                                              # debug
         print("      Option ", option, " score ", score)                                            # debug
-        game.prettyPath(path)                                                                       # debug
+        game.prettyPath(pv.path(newGame, False, score))                                             # debug
 
-    print("      Evaluated {} nodes".format(visitedNodes))                                          # debug
+    stats.stop()                                                                                    # debug
+    print("      Evaluated {nodes} nodes in {seconds:.3f}s, effective branching factor {branchingFactor:.2f}".format(**stats.getStats()))
 
     # Apply the winning move (randomly choose from moves with equal best score)
     move = random.choice(bestOptions)
 
-    return move
+    return move, stats
 
 def computerMove(game, algorithm=ALG_RANDOM):
     # Get computer move and stop if the game is over
+    # Returns a (move, stats) tuple, where stats is the SearchStats for the search, or None for a random move
     print("\nComputer move:")
+    stats = None
     if algorithm==ALG_MINIMAX:
-        move = computerMoveMinimax(game, ALG_MINIMAX)
+        move, stats = computerMoveMinimax(game, ALG_MINIMAX)
     elif algorithm==ALG_ALPHABETA:
-        move = computerMoveMinimax(game, ALG_ALPHABETA)
+        move, stats = computerMoveMinimax(game, ALG_ALPHABETA)
     else:
         move = computerMoveRandom(game)
 
     game.applyMove(move, True)
 
-    return move
+    return move, stats
 
 
 def play(game, algorithm=ALG_RANDOM):
     # Execute alternating player / computer moves
+    # Returns a list of the SearchStats for each computer move searched, so the game can be logged
+    gameStats = []
+
     while True:
         # Get player move and stop if the game is over
         game.playerMove()
@@ -210,7 +223,9 @@ def play(game, algorithm=ALG_RANDOM):
             break
 
         # Get computer move and stop if the game is over
-        computerMove(game, algorithm)
+        move, stats = computerMove(game, algorithm)
+        if stats is not None:
+            gameStats.append(stats)
         score, gameOver = game.getScore()
         if gameOver:
             break
@@ -225,4 +240,6 @@ def play(game, algorithm=ALG_RANDOM):
         print("It's a draw")
     game.show()
 
+    return gameStats
+
 
@@ -0,0 +1,107 @@
+'''
+moveordering.py
+
+Implements move ordering for the alpha-beta and negamax algorithms found in minimax.py.  They prune
+the most when the best move at each node is searched first, so the moves are put in this order:
+    - the principal variation move, i.e. the best move found by an earlier search of the same
+      state, taken from the transposition table
+    - killer moves, which recently caused a cutoff at the same depth
+    - the rest, best history score first.  The history score of a move goes up each time it
+      causes a cutoff, by more for cutoffs higher up the tree
+
+Before that, the game can supply a static ordering by implementing an optional method:
+
+    def orderMoves(self, moves):
+        """Return the given moves, most promising first"""
+
+Each heuristic can be turned off, and the counters show how often the first move searched was good
+enough to cause a cutoff, which is the measure of how well the ordering is working.
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
+
+class MoveOrdering:
+    """Orders the moves at each node, learning from the cutoffs found as the search goes"""
+
+    def __init__(self, usePV=True, killerSlots=2, useHistory=True, useGameOrder=True, generator=None):
+        """
+        Set up the heuristics to use.
+        killerSlots is the number of killer moves to keep for each depth, 0 to turn them off.
+        generator is an optional random.Random used to shuffle the moves before they are ordered, so
+        moves the heuristics rank equally are searched in a different order.  Lazy SMP uses this to
+        stop its helper searches all following the same path.
+        """
+
+        self.usePV = usePV
+        self.killerSlots = killerSlots
+        self.useHistory = useHistory
+        self.useGameOrder = useGameOrder
+        self.generator = generator
+        self.clear()
+
+    def clear(self):
+        """Forget the killer moves and history scores and reset the counters"""
+
+        self.killers = []                                                                           # killer moves for each depth
+        self.history = {}                                                                           # (maxTurn, move) -> history score
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    def orderMoves(self, game, moves, maxTurn, depth, pvMove=None):
+        """Return the given moves in the order they should be searched"""
+
+        moves = list(moves)
+        if self.generator is not None:
+            self.generator.shuffle(moves)
+        if self.useGameOrder and hasattr(game, "orderMoves"):
+            moves = list(game.orderMoves(moves))
+        if self.useHistory and self.history:
+            history = self.history
+            moves.sort(key=lambda move: history.get((maxTurn, move), 0), reverse=True)                 # stable, so ties keep the game's order
+
+        # Bring the principal variation move and then the killer moves to the front
+        first = []
+        if self.usePV and pvMove is not None and pvMove in moves:
+            first.append(pvMove)
+        if 0 <= depth < len(self.killers):                                                          # no killers are kept above depth 0
+            for killer in self.killers[depth]:
+                if killer in moves and killer not in first:
+                    first.append(killer)
+        if not first:
+            return moves
+
+        return first + [move for move in moves if move not in first]
+
+    def recordCutoff(self, move, maxTurn, depth, remainingDepth, moveNumber):
+        """
+        Learn from a move that caused a cutoff.
+        moveNumber is the position of the move in the searched order, starting at 0.
+        """
+
+        self.cutoffs += 1
+        if moveNumber == 0:
+            self.firstMoveCutoffs += 1
+
+        # Keep the most recent killers for this depth
+        if self.killerSlots > 0:
+            while len(self.killers) <= depth:
+                self.killers.append([])
+            killers = self.killers[depth]
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[self.killerSlots:]
+
+        # Cutoffs with more of the tree below them count for more
+        if self.useHistory:
+            self.history[(maxTurn, move)] = self.history.get((maxTurn, move), 0) + remainingDepth * remainingDepth
+
+    def getStats(self):
+        """Return the ordering counters as a dictionary"""
+
+        return {
+            "cutoffs": self.cutoffs,
+            "firstMoveCutoffs": self.firstMoveCutoffs,
+            "firstMoveCutoffRate": self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0,
+        }
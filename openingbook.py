@@ -0,0 +1,296 @@
+'''
+openingbook.py
+
+An opening book for games played on a Stack2D or BitStack2D board, such as Connect 4, whose moves
+are the numbers of the stacks to drop a piece in.
+
+The first few moves of a game are the most expensive to search, as the whole board is still open,
+and the same positions come up every game.  buildBook() searches every position in the first few
+plies offline, deeper than a game could afford to, and writes the results to a book file.  It can
+be passed as the book to computerMove() or play() in minimax.py, and answers from the book before
+any search is started.
+
+The book file is a header followed by fixed-size entries sorted by key, so OpeningBook memory maps
+it and finds a position with a binary search rather than loading it.  Each entry holds:
+    - the Zobrist key of the canonical form of the position (see Board2D.canonicalForm()), so mirror
+      image positions share an entry
+    - the best moves, as a bit mask with bit n set for stack n of the canonical position
+    - the score of the position with the computer to move, and the depth it was searched to
+
+Building can take a long time, so each result is appended to a journal file as soon as it is found.
+If the build is stopped, running it again carries on where it left off.  The positions are searched
+in parallel, one per process.
+
+Build a Connect 4 book, after checking a small one against alpha-beta search, with:
+
+    python openingbook.py [plies] [depth] [workers]
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import mmap
+import os
+import random
+import struct
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from minimax import alphabeta, uniqueMoves, SearchLimits, INFINITY
+from transposition import TranspositionTable
+from moveordering import MoveOrdering
+from gamestate import inverseTransform
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+MAGIC = b"BOOK"                     # identifies a book file
+VERSION = 1                         # changes whenever the file layout does
+HEADER = struct.Struct("<4sHBBHHI") # magic, version, rows, cols, plies, depth, number of entries
+ENTRY_TYPE = np.dtype([("key", "<u8"), ("moves", "<u4"), ("score", "<i2"), ("depth", "<u2")])
+
+DEFAULT_PLIES = 4                   # positions with fewer pieces than this are put in the book
+DEFAULT_EXTRA_DEPTH = 2             # by default the book is searched this much deeper than game.maxDepth
+
+
+# -------------------------------------------------------------------------------------------------
+# Building the book
+# -------------------------------------------------------------------------------------------------
+
+def findOpenings(game, plies):
+    """
+    Find every position within the given number of plies of the start of the game with the computer
+    to move, whichever side starts.  game is the starting position.
+    Returns a dictionary mapping the canonical key of each position to a game in that position.
+    """
+
+    openings = {}
+    visited = set()
+
+    def visit(game, computerTurn, ply):
+        score, gameOver = game.getScore()
+        key = game.state.canonicalKey()
+        if gameOver or ply >= plies or (key, computerTurn) in visited:
+            return
+        visited.add((key, computerTurn))
+        if computerTurn:
+            openings[key] = game
+
+        for move in game.getPossibleMoves():
+            newGame = game.copy()
+            newGame.applyMove(move, computerTurn)
+            visit(newGame, not computerTurn, ply + 1)
+
+    visit(game.copy(), True, 0)
+    visit(game.copy(), False, 0)
+
+    return openings
+
+
+def solveOpening(game, depth):
+    """
+    Search every move the computer can make in the given position to the given depth.
+    Returns a book entry for the position, as a (key, moves, score, depth) tuple.
+    """
+
+    canonical, transform = game.state.canonicalForm()
+    table = TranspositionTable()
+    ordering = MoveOrdering()
+    limits = SearchLimits(depth)
+
+    # Score every move, searching only one of each set of mirror image moves
+    scores = {}
+    equivalents = uniqueMoves(game, game.getPossibleMoves())
+    for option, moves in equivalents.items():
+        newGame = game.copy()
+        newGame.applyMove(option, True)
+        score = alphabeta(newGame, False, -INFINITY, INFINITY, 0, table, limits, ordering)
+        for move in moves:
+            scores[move] = score
+
+    # Keep the best moves as they would be played in the canonical position
+    bestScore = max(scores.values())
+    moves = 0
+    for move, score in scores.items():
+        if score == bestScore:
+            moves |= 1 << game.state.transformStack(move, transform)
+
+    return canonical.zobristKey, moves, bestScore, depth
+
+
+def readJournal(path):
+    """Read the entries saved so far by buildBook(), ignoring any entry left half written"""
+
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=ENTRY_TYPE)
+
+    with open(path, "rb") as journal:
+        data = journal.read()
+    count = len(data) // ENTRY_TYPE.itemsize
+
+    return np.frombuffer(data[:count * ENTRY_TYPE.itemsize], dtype=ENTRY_TYPE)
+
+
+def writeBook(path, entries, rows, cols, plies, depth):
+    """Write the given entries to a book file, sorted by key, keeping the deepest entry for each key"""
+
+    entries = np.sort(entries, order=["key", "depth"])[::-1]
+    keys, first = np.unique(entries["key"], return_index=True)
+    entries = entries[first]                                                                        # sorted by key again, deepest entry for each
+
+    # Write to a temporary file first, so a reader never sees half a book
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "wb") as bookFile:
+        bookFile.write(HEADER.pack(MAGIC, VERSION, rows, cols, plies, depth, len(entries)))
+        bookFile.write(entries.tobytes())
+    os.replace(temporaryPath, path)
+
+
+def buildBook(game, path, plies=DEFAULT_PLIES, depth=None, workers=None):
+    """
+    Build a book of the positions within the given number of plies of game, searched to the given
+    depth, and write it to path.  The results are saved to path + ".journal" as they are found, and
+    positions already in the journal to at least the same depth aren't searched again, so a build
+    that was stopped can be resumed.  workers is the number of processes, by default one per CPU.
+    Returns the number of positions searched by this call.
+    """
+
+    if depth is None:
+        depth = game.maxDepth + DEFAULT_EXTRA_DEPTH
+    journalPath = path + ".journal"
+
+    # Only search the positions the journal doesn't already have
+    entries = readJournal(journalPath)
+    done = set(int(key) for key in entries["key"][entries["depth"] >= depth])
+    openings = findOpenings(game, plies)
+    pending = [opening for key, opening in openings.items() if key not in done]
+
+    # Search the positions in parallel, saving each result as soon as it arrives
+    with open(journalPath, "ab") as journal:
+        journal.truncate(len(entries) * ENTRY_TYPE.itemsize)                                       # drop any entry left half written
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [executor.submit(solveOpening, opening, depth) for opening in pending]
+            for count, future in enumerate(as_completed(futures), 1):
+                journal.write(np.array([future.result()], dtype=ENTRY_TYPE).tobytes())
+                journal.flush()
+                if count % 50 == 0:
+                    print("Searched {} of {} positions".format(count, len(pending)))
+
+    writeBook(path, readJournal(journalPath), game.state.rows, game.state.cols, plies, depth)
+
+    return len(pending)
+
+
+# -------------------------------------------------------------------------------------------------
+# Probing the book
+# -------------------------------------------------------------------------------------------------
+
+class OpeningBook:
+    """An opening book, memory mapped from its file"""
+
+    def __init__(self, path):
+        """Open the book"""
+
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.rows, self.cols, self.plies, self.depth, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a version {} opening book".format(path, VERSION))
+        self.entries = np.frombuffer(self.map, dtype=ENTRY_TYPE, count=count, offset=HEADER.size)
+        self.keys = self.entries["key"]
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        """Unmap the book and close its file"""
+
+        self.entries = None                                                                         # the map can't close while a view of it exists
+        self.keys = None
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, board):
+        """
+        Look up the given board, with the computer to move.
+        Returns a (score, best moves, depth) tuple, or None if the position isn't in the book.
+        """
+
+        if (board.rows, board.cols) != (self.rows, self.cols):
+            return None
+
+        canonical, transform = board.canonicalForm()
+        index = np.searchsorted(self.keys, canonical.zobristKey)
+        if index == len(self.keys) or self.keys[index] != canonical.zobristKey:
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        # The moves are stored for the canonical position, so turn them back into moves for this one
+        key, moves, score, depth = self.entries[index]
+        inverse = inverseTransform(transform)
+        bestMoves = [board.transformStack(stack, inverse) for stack in range(self.cols) if moves & (1 << stack)]
+
+        return int(score), sorted(bestMoves), int(depth)
+
+    def probe(self, game):
+        """Get a best move for the computer in the given game, chosen randomly from the equal best, or None"""
+
+        entry = self.lookup(game.state)
+        if entry is None:
+            return None
+
+        return random.choice(entry[1])
+
+
+# -------------------------------------------------------------------------------------------------
+# Main program
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    from connect4 import Connect4
+
+    # Check a small book against a fresh alpha-beta search of every move, without the table, move
+    # ordering or symmetries the book was built with, in the positions met in some random games
+    generator = random.Random(1)
+    with tempfile.TemporaryDirectory() as directory:
+        checkPath = os.path.join(directory, "check.book")
+        buildBook(Connect4(), checkPath, 3, 4, 1)
+        with OpeningBook(checkPath) as book:
+            for gameNumber in range(20):
+                game = Connect4()
+                computerTurn = gameNumber % 2 == 0
+                for ply in range(3):
+                    if computerTurn:
+                        scores = {}
+                        for move in game.getPossibleMoves():
+                            newGame = game.copy()
+                            newGame.applyMove(move, True)
+                            scores[int(move)] = alphabeta(newGame, False, -INFINITY, INFINITY, 0, None, SearchLimits(4))
+                        bestScore = max(scores.values())
+                        bestMoves = sorted(move for move, score in scores.items() if score == bestScore)
+                        assert (book.lookup(game.state) == (bestScore, bestMoves, 4))
+                        assert (book.probe(game) in bestMoves)
+                    game.applyMove(generator.choice(list(game.getPossibleMoves())), computerTurn)
+                    computerTurn = not computerTurn
+                if computerTurn:
+                    assert (book.lookup(game.state) is None)                                        # too deep to be in the book
+
+    arguments = [int(argument) for argument in sys.argv[1:]]
+    plies, depth, workers = (arguments + [DEFAULT_PLIES, None, None][len(arguments):])[:3]
+    count = buildBook(Connect4(), "connect4.book", plies, depth, workers)
+    with OpeningBook("connect4.book") as book:
+        print("Searched {} positions, the book now has {}".format(count, len(book)))
@@ -84,6 +84,13 @@ class Oxo:
         col = move % 3
         self.state.setCell(row, col, 'X' if computerTurn else 'O')
 
+    def undoMove(self, move):
+        """Undo the given move, which must be the last move applied"""
+
+        row = int(move / 3)
+        col = move % 3
+        self.state.clearCell(row, col)
+
     def getScore(self):
         """
         Get the score for the current game state.
@@ -96,29 +103,21 @@ class Oxo:
 
         board = self.state
 
-        def findWin(value):
-
-            # Check for win on horizontal
-            if (board.isHorizRun(1, 0, 3, value)):
-                return True
-
-            # Check for win on vertical
-            # ***TODO***: Enter your code here
-
-            # Check for win on diagonal
-            # ***TODO***: Enter your code here
-
-            # No winning line found
-            # ***TODO***: Enter your code here
-
-            return False
+        # Only the lines through the last move can have been won, if we know what it was.
+        # Otherwise check all the lines on the board in one go
+        if board.lastMove is None:
+            winner = board.winner(RUNLENGTH)
+        elif board.lastMoveWins(RUNLENGTH):
+            winner = board.getCell(*board.lastMove)
+        else:
+            winner = None
 
         # Check for computer win
-        if findWin('X'):
+        if winner == 'X':
             return (100, True)
 
         # Check for player win
-        if findWin('O'):
+        if winner == 'O':
             return (-100, True)
 
         # Check if grid full, i.e. it's a draw
@@ -138,6 +137,27 @@ class Oxo:
 
         return Oxo(self.state.copy())
 
+    def getSymmetries(self):
+        """Return the transforms that leave the current game state unchanged"""
+
+        return self.state.getSymmetries()
+
+    def transformMove(self, move, transform):
+        """Return the move that the given transform maps the given move onto"""
+
+        row, col = self.state.transformCell(int(move / 3), move % 3, transform)
+        return row * 3 + col
+
+    def getKey(self):
+        """Return a hashable value that identifies the current game state"""
+
+        return self.state.zobristKey
+
+    def getRunLength(self):
+        """Return the length of run on the board that wins the game"""
+
+        return RUNLENGTH
+
     def prettyPath(self, path):
         """
         Show the evaluation path neatly formatted.
@@ -167,6 +187,7 @@ class Oxo:
 # Main program
 # -------------------------------------------------------------------------------------------------
 
-game = Oxo()
-play(game, ALG_MINIMAX)
+if __name__ == "__main__":
+    game = Oxo()
+    play(game, ALG_MINIMAX)
 
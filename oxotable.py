@@ -0,0 +1,195 @@
+'''
+oxotable.py
+
+A table of perfect play for Oxo, so the computer can pick its move without searching.
+
+Oxo only has a few thousand positions, so buildTable() finds every one the computer can be asked to
+move from, whichever side starts, and solves it once with minimax.  The results are written to a
+binary file with a fixed-size entry for every possible grid, at the grid's rank (see Board2D.rank()),
+so a position is found with one read.  Each entry holds:
+    - the score of the position with the computer to move, from minimax
+    - whether the entry was solved, since most grids can't be reached
+    - the best moves, as a bit mask with bit n set for cell n
+
+OxoTable memory maps the file, so opening it costs almost nothing and only the pages used are read.
+It can be passed as the book to computerMove() or play() in minimax.py.
+
+Build the table, and check it against alpha-beta search, with:
+
+    python oxotable.py
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import mmap
+import os
+import random
+import struct
+import numpy as np
+
+from minimax import minimax
+from transposition import TranspositionTable
+from oxo import Oxo, ROWS, COLS
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "oxo.table")  # where the table is kept
+
+MAGIC = b"OXOT"                     # identifies a table file
+VERSION = 1                         # changes whenever the file layout does
+HEADER = struct.Struct("<4sHBB")    # magic, version, rows, cols
+ENTRY_TYPE = np.dtype([("score", "i1"), ("solved", "u1"), ("moves", "<u2")])
+
+
+# -------------------------------------------------------------------------------------------------
+# Building the table
+# -------------------------------------------------------------------------------------------------
+
+def solvePositions():
+    """
+    Find every position the computer can be asked to move from, with either side starting, and solve it.
+    Returns a dictionary mapping the rank of each position to a (score, best moves) tuple.
+    """
+
+    table = TranspositionTable()
+    solved = {}
+    visited = set()
+
+    def visit(game, computerTurn):
+        score, gameOver = game.getScore()
+        rank = game.state.rank()
+        if gameOver or (rank, computerTurn) in visited:
+            return
+        visited.add((rank, computerTurn))
+
+        # Score every move the computer could make here.  The table is shared by all the searches,
+        # so each position below is only searched once
+        if computerTurn:
+            scores = {}
+            for move in game.getPossibleMoves():
+                newGame = game.copy()
+                newGame.applyMove(move, True)
+                scores[int(move)] = minimax(newGame, False, 0, table)
+            bestScore = max(scores.values())
+            solved[rank] = (bestScore, [move for move, score in scores.items() if score == bestScore])
+
+        for move in game.getPossibleMoves():
+            newGame = game.copy()
+            newGame.applyMove(move, computerTurn)
+            visit(newGame, not computerTurn)
+
+    visit(Oxo(), True)
+    visit(Oxo(), False)
+
+    return solved
+
+
+def buildTable(path=DEFAULT_PATH):
+    """Solve every position and write the table to the given file.  Returns the number of positions solved"""
+
+    solved = solvePositions()
+    entries = np.zeros(3 ** (ROWS * COLS), dtype=ENTRY_TYPE)
+    for rank, (score, moves) in solved.items():
+        entries[rank] = (score, 1, sum(1 << move for move in moves))
+
+    # Write to a temporary file first, so a reader never sees half a table
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "wb") as tableFile:
+        tableFile.write(HEADER.pack(MAGIC, VERSION, ROWS, COLS))
+        tableFile.write(entries.tobytes())
+    os.replace(temporaryPath, path)
+
+    return len(solved)
+
+
+# -------------------------------------------------------------------------------------------------
+# Looking moves up
+# -------------------------------------------------------------------------------------------------
+
+class OxoTable:
+    """The perfect play table, memory mapped from its file"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        """Open the table, building it first if the file doesn't exist"""
+
+        if not os.path.exists(path):
+            buildTable(path)
+
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, cols = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or (rows, cols) != (ROWS, COLS):
+            self.close()
+            raise ValueError("{} is not a version {} Oxo table".format(path, VERSION))
+        self.entries = np.frombuffer(self.map, dtype=ENTRY_TYPE, offset=HEADER.size)
+
+    def close(self):
+        """Unmap the table and close its file"""
+
+        self.entries = None                                                                         # the map can't close while a view of it exists
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def lookup(self, board):
+        """
+        Look up the given board, with the computer to move.
+        Returns a (score, best moves) tuple, or None if the position can't be reached or the game is over.
+        """
+
+        score, solved, moves = self.entries[board.rank()]
+        if not solved:
+            return None
+
+        return int(score), [move for move in range(ROWS * COLS) if moves & (1 << move)]
+
+    def probe(self, game):
+        """Get a best move for the computer in the given game, chosen randomly from the equal best, or None"""
+
+        entry = self.lookup(game.state)
+        if entry is None:
+            return None
+
+        return random.choice(entry[1])
+
+
+# -------------------------------------------------------------------------------------------------
+# Main program
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    from minimax import alphabeta, INFINITY
+
+    count = buildTable()
+    print("Solved {} positions, written to {}".format(count, DEFAULT_PATH))
+
+    # Check the table against a fresh alpha-beta search of the positions met in some random games,
+    # with each side starting, and that it has nothing for a finished game
+    generator = random.Random(1)
+    with OxoTable() as table:
+        for gameNumber in range(40):
+            game = Oxo()
+            computerTurn = gameNumber % 2 == 0
+            while not game.getScore()[1]:
+                if computerTurn:
+                    scores = {}
+                    for move in game.getPossibleMoves():
+                        newGame = game.copy()
+                        newGame.applyMove(move, True)
+                        scores[int(move)] = alphabeta(newGame, False, -INFINITY, INFINITY, 0)
+                    bestScore = max(scores.values())
+                    bestMoves = [move for move, score in scores.items() if score == bestScore]
+                    assert (table.lookup(game.state) == (bestScore, bestMoves))
+                    assert (table.probe(game) in bestMoves)
+                game.applyMove(generator.choice(list(game.getPossibleMoves())), computerTurn)
+                computerTurn = not computerTurn
+            assert (table.lookup(game.state) is None and table.probe(game) is None)
@@ -0,0 +1,198 @@
+'''
+playout.py
+
+Plays many random games at once from a given position, as computerMoveRandom() in minimax.py would
+play them: at every turn each side picks one of its legal moves at random, all equally likely.
+
+The games are held in a BoardBatch (see gamestate.py) and played in lockstep, one ply at a time for
+all of them, so each ply is a handful of numpy calls however many games there are.  Only the lines
+through the piece just placed are checked for a win, and games are dropped from the batch as soon
+as they finish.  The results give the share of games the computer ('X') wins, draws and loses, and
+how many plies the games lasted, which can be used to estimate how strong a position is or to test
+engines against random play.
+
+Boards of stacks, such as Stack2D and BitStack2D for Connect 4, are played by dropping pieces in the
+stacks, and any other board by placing pieces in any empty cell.
+
+Check the playouts, then run some random Oxo and Connect 4 games, with:
+
+    python playout.py [games]
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import sys
+import time
+import numpy as np
+
+from gamestate import BoardBatch, CELL_CODES, EMPTY
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+DEFAULT_BATCH_SIZE = 65536  # most games played in lockstep at once, to bound the memory used
+
+X = CELL_CODES['X']
+O = CELL_CODES['O']
+
+
+# -------------------------------------------------------------------------------------------------
+# Functions
+# -------------------------------------------------------------------------------------------------
+
+def playBatch(batch, codes, runLength, stacks, generator):
+    """
+    Play a random game from each board in the given BoardBatch, none of which can be over already.
+    The boards are played on, and dropped from the batch as they finish.
+    codes is an array holding the code of the value to move on each board.  If stacks is True the
+    pieces are dropped in stacks, otherwise they can go in any empty cell.
+    Returns a (winners, lengths) tuple of arrays with one entry per game: the code of the winner, or
+    EMPTY for a draw, and the number of plies played.
+    """
+
+    count = len(batch)
+    rows, cols = batch.rows, batch.cols
+    games = np.arange(count)                                                                        # the game each board in the batch belongs to
+    winners = np.full(count, EMPTY, dtype=np.int8)
+    lengths = np.zeros(count, dtype=np.intp)
+    codes = np.array(codes, dtype=np.int8)
+    if stacks:
+        heights = np.count_nonzero(batch.grids, axis=1)                                            # pieces in each stack of each board
+
+    ply = 0
+    while len(games) > 0:
+        ply += 1
+
+        # Pick a random legal move in every game: the legal move with the biggest random number
+        legal = heights < rows if stacks else batch.getAvailableCells()
+        choices = np.argmax(generator.random(legal.shape) * legal, axis=1)
+        if stacks:
+            boards = np.arange(len(games))
+            col = choices
+            row = heights[boards, col]
+            heights[boards, col] += 1
+        else:
+            row, col = np.divmod(choices, cols)
+        batch.setCell(row, col, codes)
+
+        # Retire the games that are over
+        won = batch.lastMoveWins(row, col, runLength)
+        if stacks:
+            finished = won | np.all(heights == rows, axis=1)
+        else:
+            finished = won | batch.boardIsFull()
+        winners[games[won]] = codes[won]
+        lengths[games[finished]] = ply
+        if finished.any():
+            playing = ~finished
+            batch.grids = batch.grids[playing]
+            games = games[playing]
+            codes = codes[playing]
+            if stacks:
+                heights = heights[playing]
+
+        codes = X + O - codes                                                                       # the other side moves next
+
+    return winners, lengths
+
+
+def simulate(board, runLength, computerTurn, games, batchSize=DEFAULT_BATCH_SIZE, seed=None):
+    """
+    Play the given number of random games from board, which can be any Board2D, Stack2D or BitStack2D,
+    with the computer ('X') to move if computerTurn is True.  A run of runLength cells wins.
+    seed seeds the random numbers, so the same games can be played again.
+    Returns a dictionary of the results, with the share of games won, drawn and lost by the computer
+    and a histogram of the number of plies the games lasted, indexed by plies.
+    """
+
+    generator = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    # A game that is already over ends where it is
+    winner = board.winner(runLength)
+    if winner is not None or board.boardIsFull():
+        winners = np.full(games, CELL_CODES[winner or '_'], dtype=np.int8)
+        lengths = np.zeros(games, dtype=np.intp)
+    else:
+        stacks = hasattr(board, "stackHeight")
+        code = X if computerTurn else O
+        results = []
+        for first in range(0, games, batchSize):
+            count = min(batchSize, games - first)
+            batch = BoardBatch(board.rows, board.cols, grids=np.repeat(board.grid[np.newaxis], count, axis=0))
+            results.append(playBatch(batch, np.full(count, code), runLength, stacks, generator))
+        winners = np.concatenate([result[0] for result in results])
+        lengths = np.concatenate([result[1] for result in results])
+
+    elapsed = time.perf_counter() - start
+    wins = int(np.count_nonzero(winners == X))
+    losses = int(np.count_nonzero(winners == O))
+    draws = games - wins - losses
+
+    return {
+        "games": games,
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "winRate": wins / games if games else 0.0,
+        "drawRate": draws / games if games else 0.0,
+        "lossRate": losses / games if games else 0.0,
+        "lengths": np.bincount(lengths).tolist(),
+        "seconds": elapsed,
+        "gamesPerSecond": games / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+# -------------------------------------------------------------------------------------------------
+# Main program
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    from gamestate import Board2D
+    from oxo import Oxo, RUNLENGTH as OXO_RUNLENGTH
+    from connect4 import Connect4, RUNLENGTH as CONNECT4_RUNLENGTH
+
+    # Check games that are already over end where they are, whoever is to move
+    for grid, result in (([['X', 'X', 'X'], ['O', 'O', '_'], ['_', '_', '_']], "wins"),
+                         ([['X', 'X', '_'], ['O', 'O', 'O'], ['X', '_', '_']], "losses"),
+                         ([['X', 'O', 'X'], ['X', 'O', 'O'], ['O', 'X', 'X']], "draws")):
+        for computerTurn in (True, False):
+            results = simulate(Board2D(3, 3, np.array(grid)), 3, computerTurn, 100)
+            assert (results[result] == 100 and results["wins"] + results["draws"] + results["losses"] == 100)
+            assert (results["lengths"] == [100])
+
+    # Check a batch of games with only one move left, which wins, loses or draws whatever is chosen
+    generator = np.random.default_rng(1)
+    win = [['X', 'X', '_'], ['O', 'O', 'X'], ['O', 'X', 'O']]
+    loss = [['X', 'X', 'O'], ['O', '_', 'X'], ['O', 'X', 'X']]
+    draw = [['X', 'O', 'X'], ['X', 'O', 'O'], ['O', 'X', '_']]
+    batch = BoardBatch(3, 3, grids=[win] * 5 + [loss] * 3 + [draw] * 2)
+    winners, lengths = playBatch(batch, [X] * 5 + [O] * 3 + [X] * 2, 3, False, generator)
+    assert (winners.tolist() == [X] * 5 + [O] * 3 + [EMPTY] * 2)
+    assert (lengths.tolist() == [1] * 10 and len(batch) == 0)
+
+    # And the same for stacks, where only the first stack has room, so the side to move fills it
+    batch = BoardBatch(2, 2, grids=[[['X', 'O'], ['_', 'O']]] * 4)
+    winners, lengths = playBatch(batch, [X, O, X, O], 2, True, generator)
+    assert (winners.tolist() == [X, O, X, O] and lengths.tolist() == [1] * 4)
+    batch = BoardBatch(2, 3, grids=[[['X', 'O', 'X'], ['_', 'O', 'X']]] * 4)
+    winners, lengths = playBatch(batch, [X, O, X, O], 3, True, generator)
+    assert (winners.tolist() == [EMPTY] * 4 and lengths.tolist() == [1] * 4)
+
+    # Check the results add up, and that the same seed plays the same games
+    results = simulate(Board2D(3, 3), 3, True, 5000, batchSize=1000, seed=7)
+    assert (results["wins"] + results["draws"] + results["losses"] == 5000 and sum(results["lengths"]) == 5000)
+    assert (min(index for index, count in enumerate(results["lengths"]) if count) == 5)                # a win takes at least 5 plies
+    again = simulate(Board2D(3, 3), 3, True, 5000, batchSize=1000, seed=7)
+    assert ((again["wins"], again["draws"], again["lengths"]) == (results["wins"], results["draws"], results["lengths"]))
+
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for name, game, runLength in (("Oxo", Oxo(), OXO_RUNLENGTH), ("Connect 4", Connect4(), CONNECT4_RUNLENGTH)):
+        results = simulate(game.state, runLength, True, games)
+        print("{}: {} random games, computer moving first".format(name, results["games"]))
+        print("    won {winRate:.1%}, drew {drawRate:.1%}, lost {lossRate:.1%}".format(**results))
+        print("    mean length {:.1f} plies".format(np.average(np.arange(len(results["lengths"])), weights=results["lengths"])))
+        print("    {gamesPerSecond:.0f} games/sec".format(**results))
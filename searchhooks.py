@@ -0,0 +1,33 @@
+'''
+searchhooks.py
+
+Hooks for watching a search in minimax.py as it runs, so tracing, counting or profiling can be
+attached to the same search functions that play the game, rather than to a separate copy of them.
+
+Pass an object with these methods as the hooks argument of minimax(), alphabeta(), negamax() or
+computerMoveMinimax().  SearchHooks does nothing in each of them, so a subclass only needs to
+override the ones it wants.  The search only checks for hooks at the points where they would be
+called, so a search without them runs as it always has.
+
+Depths are as the search functions count them, with the moves from the root at depth 0, and scores
+are always from the computer's point of view, whichever algorithm is searching.
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
+
+class SearchHooks:
+    """The hooks a search calls, all doing nothing"""
+
+    def onNode(self, game, maxTurn, depth):
+        """Called as each node is entered, before anything else is done with it"""
+
+    def onLeaf(self, game, maxTurn, depth, score, gameOver):
+        """Called when a node is scored without searching below it, because the game is over or the depth limit was reached"""
+
+    def onCutoff(self, game, maxTurn, depth, move, moveNumber):
+        """Called when the given move, the moveNumber'th searched, causes an alpha-beta cutoff"""
+
+    def onBestUpdate(self, game, maxTurn, depth, move, score):
+        """Called when the given move improves on the best score found so far at a node"""
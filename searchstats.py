@@ -0,0 +1,120 @@
+'''
+searchstats.py
+
+Collects statistics about a single search, so the work an engine does can be measured and logged
+rather than read off the screen.  SearchStats is a set of search hooks (see searchhooks.py), so
+passing it as the hooks of any of the searches in minimax.py counts the work as it is done, and the
+results can be read as a dictionary or written as a line of JSON.
+
+Depths are as the search functions count them, with the moves from the root at depth 0.
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import json
+import time
+
+from searchhooks import SearchHooks
+
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
+
+class SearchStats(SearchHooks):
+    """The statistics for one search"""
+
+    def __init__(self, table=None):
+        """
+        Start the clock for a new search.
+        table is the transposition table the search uses, if any.  Its counters are noted now, so
+        that only the probes made by this search count towards the hit rate.
+        """
+
+        self.nodes = 0                                                                              # every node visited
+        self.leaves = 0                                                                             # nodes scored because they reached the depth limit
+        self.terminals = 0                                                                          # nodes where the game was over
+        self.cutoffs = []                                                                           # alpha-beta cutoffs at each depth
+        self.maxDepth = -1                                                                          # deepest node visited
+        self.table = table
+        self.tableStart = table.getStats() if table is not None else None
+        self.startTime = time.perf_counter()
+        self.endTime = None
+
+    def onNode(self, game, maxTurn, depth):
+        """Count a node at the given depth"""
+
+        self.nodes += 1
+        if depth > self.maxDepth:
+            self.maxDepth = depth
+
+    def onLeaf(self, game, maxTurn, depth, score, gameOver):
+        """Count a node where the game was over, or that reached the depth limit"""
+
+        if gameOver:
+            self.terminals += 1
+        else:
+            self.leaves += 1
+
+    def onCutoff(self, game, maxTurn, depth, move, moveNumber):
+        """Count an alpha-beta cutoff at the given depth"""
+
+        while len(self.cutoffs) <= depth:
+            self.cutoffs.append(0)
+        self.cutoffs[depth] += 1
+
+    def stop(self):
+        """Stop the clock at the end of the search"""
+
+        self.endTime = time.perf_counter()
+
+    def elapsed(self):
+        """Get the time the search took, or has taken so far, in seconds"""
+
+        endTime = self.endTime if self.endTime is not None else time.perf_counter()
+        return endTime - self.startTime
+
+    def branchingFactor(self):
+        """
+        Get the effective branching factor: the number of moves per node a tree of uniform width,
+        as deep as the deepest node, would need to have as many nodes as were visited.
+        """
+
+        plies = self.maxDepth + 1
+        if plies < 1 or self.nodes < 1:
+            return 0.0
+
+        return self.nodes ** (1 / plies)
+
+    def getStats(self):
+        """Return the statistics as a dictionary"""
+
+        elapsed = self.elapsed()
+        stats = {
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "terminals": self.terminals,
+            "cutoffs": sum(self.cutoffs),
+            "cutoffsByDepth": list(self.cutoffs),
+            "maxDepth": self.maxDepth,
+            "branchingFactor": self.branchingFactor(),
+            "seconds": elapsed,
+            "nodesPerSecond": self.nodes / elapsed if elapsed > 0 else 0.0,
+        }
+
+        # Only count the table probes made since the search started
+        if self.table is not None:
+            tableStats = self.table.getStats()
+            hits = tableStats["hits"] - self.tableStart["hits"]
+            probes = hits + tableStats["misses"] - self.tableStart["misses"]
+            stats["tableHits"] = hits
+            stats["tableProbes"] = probes
+            stats["tableHitRate"] = hits / probes if probes else 0.0
+
+        return stats
+
+    def toJSON(self):
+        """Return the statistics as a single line of JSON"""
+
+        return json.dumps(self.getStats())
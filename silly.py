@@ -79,6 +79,10 @@ class Silly:
 
         board[move] = 'X' if computerTurn else 'O'
 
+    def undoMove(self, move):
+        """Undo the given move, which must be the last move applied"""
+
+        self.state[move] = '_'
 
     def getScore(self):
         """
@@ -111,7 +115,11 @@ class Silly:
 
         return Silly(self.state.copy())
 
-       
+    def getKey(self):
+        """Return a hashable value that identifies the current game state"""
+
+        return ''.join(self.state)
+
     def prettyPath(self, path):
         """
         Show the evaluation path neatly formatted.
@@ -139,5 +147,6 @@ class Silly:
 # Main program
 # -------------------------------------------------------------------------------------------------
 
-game = Silly()
-play(game, ALG_MINIMAX)
+if __name__ == "__main__":
+    game = Silly()
+    play(game, ALG_MINIMAX)
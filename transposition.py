@@ -0,0 +1,412 @@
+'''
+transposition.py
+
+Implements a transposition table for the minimax and alpha-beta algorithms found in minimax.py
+and minimaxdebug.py.  The same game state is often reached by several different move orders, and
+the table lets the search reuse the result instead of searching the subtree again.
+
+Requires the implementation of an additional method in the Game class:
+
+    def getKey(self):
+        """Return a hashable value that identifies the current game state"""
+
+The table has a fixed number of buckets, so its memory use is bounded.  Each bucket holds two
+entries:
+    - a depth-preferred entry, which is only replaced by a search of at least the same depth
+    - an always-replace entry, which holds the most recent result that didn't fit in the first
+
+A table can be kept from one move to the next, so a search starts with the results an earlier search
+found below the moves that were actually played.  Call newSearch() before each search: entries
+stored by earlier searches can then be replaced by any new result, however deep they are, unless the
+new search uses them, so the lines the game didn't take age out of the table.
+
+SharedTranspositionTable works the same way, but keeps its entries in shared memory so that several
+search processes can use one table.
+'''
+
+# -------------------------------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------------------------------
+
+import numpy as np
+from multiprocessing import shared_memory
+
+# -------------------------------------------------------------------------------------------------
+# Constants
+# -------------------------------------------------------------------------------------------------
+
+EXACT = 0            # the stored score is the exact minimax value
+LOWERBOUND = 1       # the search failed high, the true value is at least the stored score
+UPPERBOUND = 2       # the search failed low, the true value is at most the stored score
+
+DEFAULT_SIZE = 65536 # default number of buckets in the table
+
+RESOLVED_DEPTH = 32767  # depth stored for a result searched right to the end of the game, good for any depth
+
+KEY_MASK = (1 << 64) - 1  # SharedTranspositionTable keeps 64 bits of each key's hash
+VALID_BIT = 1 << 63       # set in the data word of every SharedTranspositionTable entry in use
+GENERATION_SHIFT = 50     # where the generation goes in a SharedTranspositionTable data word
+GENERATION_MASK = 0x1FFF  # SharedTranspositionTable keeps 13 bits of the generation
+
+
+# -------------------------------------------------------------------------------------------------
+# Classes
+# -------------------------------------------------------------------------------------------------
+
+class TranspositionTable:
+    """
+    A bounded cache of search results keyed by game state.
+    Entries are (key, score, depth, flag, move, generation) tuples where depth is the remaining search
+    depth below the stored state, flag is one of EXACT, LOWERBOUND or UPPERBOUND, move is the best move
+    found, or None if no move was better than the others, and generation is the search that last used
+    the entry.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """Set the table up with the given number of buckets"""
+
+        if size < 1:
+            raise ValueError("Transposition table size must be at least 1")
+
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+
+        self.depthEntries = [None] * self.size                                                      # depth-preferred entry per bucket
+        self.recentEntries = [None] * self.size                                                     # always-replace entry per bucket
+        self.generation = 0
+        self.hits = 0
+        self.carriedHits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def newSearch(self):
+        """Start a new search, so that the entries stored so far can be replaced once they stop being used"""
+
+        self.generation += 1
+
+    def lookup(self, key, depth):
+        """
+        Find the entry for the given key.
+        depth is the remaining depth the caller is about to search; entries from a shallower
+        search are not good enough and are treated as a miss.
+        Returns a (score, flag, depth) tuple or None.
+        """
+
+        index = hash(key) % self.size
+        occupied = False
+        for entries in (self.depthEntries, self.recentEntries):
+            entry = entries[index]
+            if entry is None:
+                continue
+            if entry[0] == key:
+                if entry[2] >= depth:
+                    self.hits += 1
+                    if entry[5] != self.generation:
+                        self.carriedHits += 1
+                        entries[index] = entry[:5] + (self.generation,)                            # still in use, so it shouldn't age out
+                    return entry[1], entry[3], entry[2]
+                occupied = False                                                                    # right state, just not deep enough
+                break
+            occupied = True
+
+        if occupied:
+            self.collisions += 1                                                                    # bucket is full of other states
+        self.misses += 1
+        return None
+
+    def getMove(self, key):
+        """
+        Get the best move stored for the given key, whatever the depth it was searched to, or None.
+        This is used to order moves rather than to skip a search, so it isn't counted as a probe.
+        """
+
+        index = hash(key) % self.size
+        for entry in (self.depthEntries[index], self.recentEntries[index]):
+            if entry is not None and entry[0] == key:
+                return entry[4]
+
+        return None
+
+    def store(self, key, score, depth, flag, move=None):
+        """Store the result of searching the given key to the given remaining depth"""
+
+        index = hash(key) % self.size
+        current = self.depthEntries[index]
+        if move is None and current is not None and current[0] == key:
+            move = current[4]                                                                       # keep the best move from an earlier search
+        entry = (key, score, depth, flag, move, self.generation)
+        self.stores += 1
+
+        # Keep the deepest search in the depth-preferred entry, demoting whatever was there, unless
+        # what is there is left over from an earlier search
+        if current is None or current[0] == key or depth >= current[2] or current[5] != self.generation:
+            self.depthEntries[index] = entry
+            if current is None or current[0] == key:
+                return
+            entry = current
+
+        # Anything else goes in the always-replace entry
+        recent = self.recentEntries[index]
+        if recent is not None and recent[0] != key and recent[0] != entry[0]:
+            self.overwrites += 1
+        self.recentEntries[index] = entry
+
+    def getStats(self):
+        """Return the table counters as a dictionary"""
+
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "carriedHits": self.carriedHits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "hitRate": self.hits / probes if probes else 0.0,
+        }
+
+
+class SharedTranspositionTable:
+    """
+    A transposition table in shared memory, so several processes can search using the same table.
+    It has the same methods as TranspositionTable, but entries are packed into pairs of 64-bit words,
+    so there are some restrictions:
+        - keys must hash the same way in every process, which integer keys such as Zobrist keys do
+        - scores must fit in 16 bits, and only moves which are integers from 0 to 65534 are kept
+    There are no locks.  Each entry is written as its data and its key XOR-ed with that data, so an
+    entry that one process reads while another is half way through writing it just fails to match
+    and is treated as a miss.
+    The counters are kept separately by each process.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, name=None):
+        """
+        Create a table with the given number of buckets, or attach to the existing table with the
+        given shared memory name.  Pickling the table sends its name, so other processes attach to it.
+        """
+
+        if size < 1:
+            raise ValueError("Transposition table size must be at least 1")
+
+        self.size = size
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=size * 2 * 2 * 8)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self.memory.name
+        self.entries = np.ndarray((size, 2, 2), dtype=np.uint64, buffer=self.memory.buf)          # bucket, entry, (check, data)
+        if self.owner:
+            self.entries[:] = 0
+        self.generation = 0
+        self.clearCounters()
+
+    def __getstate__(self):
+        return {"size": self.size, "name": self.name, "generation": self.generation}
+
+    def __setstate__(self, state):
+        self.__init__(state["size"], state["name"])
+        self.generation = state["generation"]
+
+    def close(self):
+        """Detach from the shared memory, freeing it if this is the process that created the table"""
+
+        self.entries = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def clearCounters(self):
+        """Reset this process's counters"""
+
+        self.hits = 0
+        self.carriedHits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+
+        self.entries[:] = 0
+        self.clearCounters()
+
+    def newSearch(self):
+        """
+        Start a new search, as TranspositionTable.newSearch() does.  Processes attached to the table
+        afterwards are given the new generation, so this must be called before the helpers start.
+        """
+
+        self.generation = (self.generation + 1) & GENERATION_MASK
+
+    def findEntry(self, key):
+        """
+        Find the data word for the given key.
+        Returns a (hash, entry number, data) tuple, where data is 0 if the key isn't in the table.
+        """
+
+        keyHash = hash(key) & KEY_MASK
+        bucket = self.entries[keyHash % self.size]
+        for entryNumber in (0, 1):
+            data = int(bucket[entryNumber, 1])
+            if data & VALID_BIT and int(bucket[entryNumber, 0]) ^ data == keyHash:
+                return keyHash, entryNumber, data
+
+        return keyHash, None, 0
+
+    def lookup(self, key, depth):
+        """
+        Find the entry for the given key.
+        depth is the remaining depth the caller is about to search; entries from a shallower
+        search are not good enough and are treated as a miss.
+        Returns a (score, flag, depth) tuple or None.
+        """
+
+        keyHash, entryNumber, data = self.findEntry(key)
+        if entryNumber is not None:
+            entryDepth = (data >> 16) & 0xFFFF
+            if entryDepth >= depth:
+                self.hits += 1
+                if (data >> GENERATION_SHIFT) & GENERATION_MASK != self.generation:
+                    self.carriedHits += 1
+                    data = (data & ~(GENERATION_MASK << GENERATION_SHIFT)) | (self.generation << GENERATION_SHIFT)
+                    entry = self.entries[keyHash % self.size, entryNumber]
+                    entry[1] = data                                                                 # still in use, so it shouldn't age out
+                    entry[0] = keyHash ^ data
+                return (data & 0xFFFF) - 32768, (data >> 32) & 3, entryDepth
+        elif int(self.entries[keyHash % self.size, 0, 1]) & VALID_BIT:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def getMove(self, key):
+        """
+        Get the best move stored for the given key, whatever the depth it was searched to, or None.
+        This is used to order moves rather than to skip a search, so it isn't counted as a probe.
+        """
+
+        keyHash, entryNumber, data = self.findEntry(key)
+        move = (data >> 34) & 0xFFFF
+        if entryNumber is None or move == 0:
+            return None
+
+        return move - 1
+
+    def store(self, key, score, depth, flag, move=None):
+        """Store the result of searching the given key to the given remaining depth"""
+
+        keyHash, entryNumber, current = self.findEntry(key)
+        if move is None and entryNumber is not None:
+            moveBits = (current >> 34) & 0xFFFF                                                     # keep the best move from an earlier search
+        elif isinstance(move, (int, np.integer)) and 0 <= move < 0xFFFF:
+            moveBits = int(move) + 1
+        else:
+            moveBits = 0
+        data = VALID_BIT | (self.generation << GENERATION_SHIFT) | (moveBits << 34) | (flag << 32) | (min(depth, 0xFFFF) << 16) | ((int(score) + 32768) & 0xFFFF)
+        self.stores += 1
+
+        # Keep the deepest search in the depth-preferred entry, demoting whatever was there, unless
+        # what is there is left over from an earlier search
+        bucket = self.entries[keyHash % self.size]
+        deepData = int(bucket[0, 1])
+        deepCheck = int(bucket[0, 0])
+        if (not deepData & VALID_BIT or entryNumber == 0 or depth >= (deepData >> 16) & 0xFFFF
+                or (deepData >> GENERATION_SHIFT) & GENERATION_MASK != self.generation):
+            bucket[0, 1] = data
+            bucket[0, 0] = keyHash ^ data
+            if not deepData & VALID_BIT or entryNumber == 0:
+                return
+            keyHash, data = deepCheck ^ deepData, deepData
+
+        # Anything else goes in the always-replace entry
+        if int(bucket[1, 1]) & VALID_BIT and entryNumber != 1:
+            self.overwrites += 1
+        bucket[1, 1] = data
+        bucket[1, 0] = keyHash ^ data
+
+    def getStats(self):
+        """Return this process's counters as a dictionary"""
+
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "hits": self.hits,
+            "carriedHits": self.carriedHits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "hitRate": self.hits / probes if probes else 0.0,
+        }
+
+
+# -------------------------------------------------------------------------------------------------
+# Code to test the transposition tables
+# -------------------------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import pickle
+    import random
+
+    # Check entries come back from the shared table as they were stored, including negative scores,
+    # results good for any depth and the best move
+    with SharedTranspositionTable(1024) as table:
+        entries = [(12345, -100, 3, UPPERBOUND, 6), (-7, -1, 0, LOWERBOUND, 0), (2 ** 62 + 1, 0, RESOLVED_DEPTH, EXACT, 65534),
+                   (99, 100, 9, EXACT, None), (100, -32768, 1, LOWERBOUND, 3), (101, 32767, 2, UPPERBOUND, -1)]
+        for key, score, depth, flag, move in entries:
+            table.store(key, score, depth, flag, move)
+        for key, score, depth, flag, move in entries:
+            assert (table.lookup(key, depth) == (score, flag, depth))
+            assert (table.getMove(key) == (move if move is not None and move >= 0 else None))
+            if depth != RESOLVED_DEPTH:
+                assert (table.lookup(key, depth + 1) is None)                                      # not searched deep enough
+        assert (table.lookup(12345, 0) == (-100, UPPERBOUND, 3))
+        assert (table.lookup(54321, 0) is None and table.getMove(54321) is None)
+
+        # Storing again without a move keeps the move from before, and replaces the rest
+        table.store(12345, -5, 4, EXACT)
+        assert (table.lookup(12345, 4) == (-5, EXACT, 4) and table.getMove(12345) == 6)
+
+        # Check another process attached to the table sees the same entries, and its stores are seen here
+        table.newSearch()
+        attached = pickle.loads(pickle.dumps(table))
+        assert (attached.generation == table.generation and not attached.owner)
+        for key, score, depth, flag, move in entries[1:]:
+            assert (attached.lookup(key, depth) == (score, flag, depth))
+        attached.store(777, -42, RESOLVED_DEPTH, LOWERBOUND, 11)
+        attached.close()
+        assert (table.lookup(777, 5) == (-42, LOWERBOUND, RESOLVED_DEPTH) and table.getMove(777) == 11)
+
+        # Check the shared table gives the same answers as the ordinary one through random stores and searches
+        generator = random.Random(1)
+        local = TranspositionTable(1024)
+        table.clear()
+        for step in range(2000):
+            key = generator.randrange(200)
+            if generator.random() < 0.5:
+                move = generator.choice([None, generator.randrange(10)])
+                entry = (key, generator.randrange(-200, 201), generator.choice([generator.randrange(10), RESOLVED_DEPTH]), generator.randrange(3), move)
+                table.store(*entry)
+                local.store(*entry)
+            else:
+                depth = generator.randrange(10)
+                assert (table.lookup(key, depth) == local.lookup(key, depth))
+                assert (table.getMove(key) == local.getMove(key))
+            if step % 500 == 499:
+                table.newSearch()
+                local.newSearch()
+        assert (table.hits == local.hits and table.misses == local.misses and table.carriedHits == local.carriedHits)